@@ -0,0 +1,22 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Кеш не откатывается вместе с транзакцией теста.
+
+    Счётчики версий меняются только после фиксации транзакции, которой
+    в тестах нет, поэтому страницы прошлого теста иначе остались бы
+    в кеше.
+    """
+    from django.core.cache import cache
+
+    cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def inline_workers(settings):
+    """Загрузки, миниатюры и ленты обрабатываются в потоке теста."""
+    settings.THUMBNAIL_WORKERS = 0
+    settings.TIMELINE_WORKERS = 0
+    settings.IMAGE_UPLOAD_WORKERS = 0
@@ -0,0 +1,96 @@
+import datetime as dt
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_KEY = "version:{}"
+CHANGED_KEY = "changed:{}"
+
+
+def _initial_version():
+    # Счётчик, потерянный при вытеснении, не должен вернуться к старому
+    # значению, иначе снова станут видны устаревшие записи кеша.
+    return int(time.time() * 1000)
+
+
+def get_versions(*names):
+    """Возвращает текущие версии счётчиков {имя: версия}."""
+    keys = {VERSION_KEY.format(name): name for name in names}
+    found = cache.get_many(keys)
+    versions = {}
+    for key, name in keys.items():
+        if key not in found:
+            cache.add(key, _initial_version(), timeout=None)
+            found[key] = cache.get(key)
+        versions[name] = found[key]
+    return versions
+
+
+def bump_versions(*names):
+    """Увеличивает счётчики: всё, что было под ними закешировано, устарело.
+
+    Счётчики меняются после фиксации транзакции. Иначе читатель, успевший
+    между сбросом и фиксацией, взял бы новую версию, прочитал старые
+    строки и закешировал их под этой версией до истечения таймаута.
+    С репликой счётчики меняются ещё раз через REPLICA_STICKY_SECONDS:
+    читатель реплики мог закешировать под новой версией строки, которые
+    до реплики ещё не доехали.
+    """
+    names = set(names)
+    transaction.on_commit(lambda: _bump_after_commit(names))
+
+
+def _bump_after_commit(names):
+    _bump(names)
+    if settings.REPLICA_DATABASE:
+        timer = threading.Timer(
+            settings.REPLICA_STICKY_SECONDS, _bump, [names]
+        )
+        timer.daemon = True
+        timer.start()
+
+
+def _bump(names):
+    changed = {}
+    for name in names:
+        key = VERSION_KEY.format(name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _initial_version(), timeout=None)
+        changed[CHANGED_KEY.format(name)] = time.time()
+    cache.set_many(changed, timeout=None)
+
+
+def last_changed(*names):
+    """Время последнего сброса счётчиков для Last-Modified или None.
+
+    Потерянное время считается текущим. В ту же секунду, что и сброс,
+    возвращается None: HTTP-дата точна до секунды, и правка в пределах
+    этой секунды иначе спряталась бы за ответом 304.
+    """
+    keys = [CHANGED_KEY.format(name) for name in names]
+    found = cache.get_many(keys)
+    now = time.time()
+    for key in keys:
+        if key not in found:
+            cache.add(key, now, timeout=None)
+            found[key] = cache.get(key, now)
+    changed = max(found.values())
+    if int(changed) >= int(now):
+        return None
+    return dt.datetime.fromtimestamp(changed, dt.timezone.utc)
+
+
+def add_surrogate_keys(request, *keys):
+    """Помечает страницу ключами для кеша страниц анонимных пользователей.
+
+    Версии ключей запоминаются до чтения данных, поэтому запись,
+    случившаяся во время отрисовки, не спрячется за новой версией.
+    """
+    keys_versions = getattr(request, "surrogate_keys", {})
+    keys_versions.update(get_versions(*keys))
+    request.surrogate_keys = keys_versions
@@ -0,0 +1,189 @@
+"""Двухуровневый кеш: LRU процесса перед общим кешем.
+
+Общий кеш (CACHES[OPTIONS["SHARED"]]) видят все процессы, поэтому
+фрагмент ленты считается один раз на сервер, а сброс версий доходит до
+каждого процесса. Локальный уровень держит последние LOCAL_MAX_ENTRIES
+значений не дольше LOCAL_TIMEOUT секунд и только для ключей с
+префиксами LOCAL_PREFIXES. Туда входят лишь записи, которые сверяются
+со счётчиками версий (фрагменты лент, страницы, ответы API), а сами
+счётчики version: всегда читаются из общего кеша, так что устаревшая
+локальная копия не будет показана после записи в другом процессе.
+
+DatabaseCache — общий кеш в таблице базы с атомарным incr.
+"""
+import base64
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.db import DatabaseCache as BaseDatabaseCache
+from django.db import connections, router, transaction
+
+MISSING = object()
+
+
+class TwoTierCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self.shared_alias = options.get("SHARED", "shared")
+        self.local_max_entries = options.get("LOCAL_MAX_ENTRIES", 1000)
+        self.local_timeout = options.get("LOCAL_TIMEOUT", 30)
+        self.local_prefixes = tuple(options.get("LOCAL_PREFIXES", ()))
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    def is_local(self, key):
+        return key.startswith(self.local_prefixes)
+
+    def _local_get(self, key, version):
+        if not self.is_local(key):
+            return MISSING
+        with self._lock:
+            entry = self._local.get((key, version))
+            if entry is None:
+                return MISSING
+            pickled, expires = entry
+            if expires <= time.monotonic():
+                del self._local[(key, version)]
+                return MISSING
+            self._local.move_to_end((key, version))
+        return pickle.loads(pickled)
+
+    def _local_set(self, key, value, version, timeout=DEFAULT_TIMEOUT):
+        if not self.is_local(key):
+            return
+        ttl = self.local_timeout
+        timeout = self.get_backend_timeout(timeout)
+        if timeout is not None:
+            ttl = min(ttl, timeout - time.time())
+        # Копия в pickle, как в общем кеше: значение нельзя испортить,
+        # изменив полученный объект.
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._local[(key, version)] = (pickled, time.monotonic() + ttl)
+            self._local.move_to_end((key, version))
+            while len(self._local) > self.local_max_entries:
+                self._local.popitem(last=False)
+
+    def _local_delete(self, key, version):
+        with self._lock:
+            self._local.pop((key, version), None)
+
+    def get(self, key, default=None, version=None):
+        value = self._local_get(key, version)
+        if value is not MISSING:
+            return value
+        value = self.shared.get(key, MISSING, version=version)
+        if value is MISSING:
+            return default
+        self._local_set(key, value, version)
+        return value
+
+    def get_many(self, keys, version=None):
+        found, missing = {}, []
+        for key in keys:
+            value = self._local_get(key, version)
+            if value is MISSING:
+                missing.append(key)
+            else:
+                found[key] = value
+        if missing:
+            fetched = self.shared.get_many(missing, version=version)
+            for key, value in fetched.items():
+                self._local_set(key, value, version)
+            found.update(fetched)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version=version)
+        self._local_set(key, value, version, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version=version)
+        for key, value in data.items():
+            if key in failed:
+                self._local_delete(key, version)
+            else:
+                self._local_set(key, value, version, timeout)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.shared.add(key, value, timeout, version=version)
+        if added:
+            self._local_set(key, value, version, timeout)
+        else:
+            self._local_delete(key, version)
+        return added
+
+    def incr(self, key, delta=1, version=None):
+        self._local_delete(key, version)
+        return self.shared.incr(key, delta, version=version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version=version)
+
+    def has_key(self, key, version=None):
+        if self._local_get(key, version) is not MISSING:
+            return True
+        return self.shared.has_key(key, version=version)
+
+    def delete(self, key, version=None):
+        self._local_delete(key, version)
+        self.shared.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self._local_delete(key, version)
+        self.shared.delete_many(keys, version=version)
+
+    def clear(self):
+        """Очищает общий кеш и локальный уровень этого процесса."""
+        with self._lock:
+            self._local.clear()
+        self.shared.clear()
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
+
+
+class DatabaseCache(BaseDatabaseCache):
+    """Кеш в таблице базы, у которого incr не теряет одновременные сбросы.
+
+    Встроенный incr читает значение и записывает новое без блокировки,
+    поэтому из двух одновременных сбросов версии остаётся один.
+    """
+
+    def incr(self, key, delta=1, version=None):
+        db = router.db_for_write(self.cache_model_class)
+        connection = connections[db]
+        quote_name = connection.ops.quote_name
+        table = quote_name(self._table)
+        expires = quote_name("expires")
+        where = f"WHERE {quote_name('cache_key')} = %s"
+        cache_key = self.make_key(key, version)
+        with transaction.atomic(using=db), connection.cursor() as cursor:
+            # Пустой UPDATE блокирует строку, а в SQLite — запись в базу,
+            # до конца транзакции: второй incr ждёт и читает новое значение.
+            cursor.execute(
+                f"UPDATE {table} SET {expires} = {expires} {where}",
+                [cache_key],
+            )
+            value = self.get(key, MISSING, version=version)
+            if value is MISSING:
+                raise ValueError(f"Key '{key}' not found")
+            value += delta
+            pickled = pickle.dumps(value, self.pickle_protocol)
+            # Срок жизни не меняется, в отличие от set().
+            cursor.execute(
+                f"UPDATE {table} SET {quote_name('value')} = %s {where}",
+                [base64.b64encode(pickled).decode("latin1"), cache_key],
+            )
+        return value
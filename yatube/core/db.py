@@ -0,0 +1,16 @@
+"""Настройка соединений с базой при их создании.
+
+SQLITE_PRAGMAS применяются к каждому новому соединению SQLite: режим
+журнала WAL позволяет читать ленты, пока идёт запись поста или
+комментария, а synchronous=NORMAL, mmap_size и cache_size убирают
+лишние fsync и чтения с диска.
+"""
+from django.conf import settings
+
+
+def apply_pragmas(sender, connection, **kwargs):
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
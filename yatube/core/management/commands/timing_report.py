@@ -0,0 +1,62 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.urls import URLPattern, URLResolver, get_resolver
+
+from core import timing
+
+
+def url_names(patterns, namespace=""):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            prefix = namespace
+            if pattern.namespace:
+                prefix = f"{namespace}{pattern.namespace}:"
+            yield from url_names(pattern.url_patterns, prefix)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            yield f"{namespace}{pattern.name}"
+
+
+class Command(BaseCommand):
+    help = "Показывает гистограммы замеров Server-Timing по именам URL."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--json", action="store_true", help="Вывести гистограммы в JSON."
+        )
+        parser.add_argument(
+            "--reset", action="store_true", help="Обнулить гистограммы."
+        )
+
+    def handle(self, *args, **options):
+        names = sorted(set(url_names(get_resolver().url_patterns)))
+        names.append("<unresolved>")
+        report = {}
+        for name in names:
+            hists = {
+                metric: timing.histogram(name, metric)
+                for metric in timing.METRICS
+            }
+            if any(sum(hist.values()) for hist in hists.values()):
+                report[name] = hists
+            if options["reset"]:
+                timing.reset(name)
+        if options["json"]:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+            return
+        header = f"{'url':<32}{'n':>7}" + "".join(
+            f"{metric + ' p50/p95':>22}" for metric in timing.METRICS
+        )
+        self.stdout.write(header)
+        for name, hists in report.items():
+            count = sum(hists["total"].values())
+            cells = "".join(
+                "{:>22}".format(
+                    "{}/{}".format(
+                        timing.percentile(hist, 0.5),
+                        timing.percentile(hist, 0.95),
+                    )
+                )
+                for hist in hists.values()
+            )
+            self.stdout.write(f"{name:<32}{count:>7}{cells}")
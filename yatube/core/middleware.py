@@ -0,0 +1,168 @@
+import hashlib
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from . import routers, timing
+from .cache import get_versions
+
+PAGE_KEY = "page:{}"
+STORED_HEADERS = ("ETag", "Last-Modified")
+
+
+class AnonymousPageCacheMiddleware:
+    """Кеш целых страниц для анонимных пользователей.
+
+    Кешируются только страницы, помеченные add_surrogate_keys. Запись
+    хранит версии ключей на момент отрисовки и отдаётся, пока ни один
+    из ключей не сброшен сигналами записи.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not self.is_cacheable_request(request):
+            return self.get_response(request)
+        key = self.cache_key(request)
+        entry = cache.get(key)
+        if entry is not None:
+            content, headers, keys_versions = entry
+            if get_versions(*keys_versions) == keys_versions:
+                return self.cached_response(request, content, headers)
+        response = self.get_response(request)
+        if self.is_cacheable_response(request, response):
+            keys_versions = request.surrogate_keys
+            response["Surrogate-Key"] = " ".join(keys_versions)
+            headers = {
+                header: response[header]
+                for header in ("Content-Type", "Surrogate-Key")
+                + STORED_HEADERS
+                if response.has_header(header)
+            }
+            cache.set(
+                key,
+                (response.content, headers, keys_versions),
+                settings.PAGE_CACHE_TIMEOUT,
+            )
+        return response
+
+    @staticmethod
+    def cached_response(request, content, headers):
+        response = HttpResponse(content)
+        for header, value in headers.items():
+            response[header] = value
+        return get_conditional_response(
+            request,
+            etag=headers.get("ETag"),
+            last_modified=parse_http_date_safe(
+                headers.get("Last-Modified", "")
+            ),
+            response=response,
+        )
+
+    @staticmethod
+    def cache_key(request):
+        url = request.build_absolute_uri()
+        return PAGE_KEY.format(hashlib.md5(url.encode()).hexdigest())
+
+    @staticmethod
+    def is_cacheable_request(request):
+        return (
+            request.method in ("GET", "HEAD")
+            and not request.user.is_authenticated
+        )
+
+    @staticmethod
+    def is_cacheable_response(request, response):
+        return (
+            getattr(request, "surrogate_keys", None)
+            and response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+            and not request.META.get("CSRF_COOKIE_USED")
+            and not request.session.modified
+        )
+
+
+class ReplicaPinMiddleware:
+    """Размечает запрос для core.routers.ReplicaRouter.
+
+    Запрос с записью в базу ставит cookie, и следующие
+    REPLICA_STICKY_SECONDS секунд этот браузер читает из основной базы.
+    Без REPLICA_DATABASE не подключается.
+    """
+
+    def __init__(self, get_response):
+        if not settings.REPLICA_DATABASE:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = routers.begin_request(
+            pinned=routers.PIN_COOKIE in request.COOKIES
+        )
+        try:
+            response = self.get_response(request)
+        finally:
+            state = routers.end_request(token)
+        if state.wrote:
+            response.set_cookie(
+                routers.PIN_COOKIE,
+                "1",
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
+
+
+class ServerTimingMiddleware:
+    """Замеры запроса в заголовке Server-Timing и гистограммах по URL.
+
+    Заголовок включается настройкой SERVER_TIMING, гистограммы —
+    TIMING_HISTOGRAMS; должен стоять первым в MIDDLEWARE.
+    """
+
+    def __init__(self, get_response):
+        if not (settings.SERVER_TIMING or settings.TIMING_HISTOGRAMS):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        timing.install_template_timer()
+
+    def __call__(self, request):
+        timings = timing.RequestTimings()
+        token = timings.activate()
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timings))
+                response = self.get_response(request)
+        finally:
+            timings.deactivate(token)
+        values = {
+            "total": (time.perf_counter() - start) * 1000,
+            "db": timings.db * 1000,
+            "template": timings.template * 1000,
+            "queries": timings.queries,
+        }
+        if settings.SERVER_TIMING:
+            response["Server-Timing"] = (
+                f'db;dur={values["db"]:.1f};desc="{timings.queries} queries", '
+                f'tpl;dur={values["template"]:.1f}, '
+                f'total;dur={values["total"]:.1f}'
+            )
+        if settings.TIMING_HISTOGRAMS:
+            match = request.resolver_match
+            timing.record(
+                match.view_name if match else "<unresolved>", values
+            )
+        return response
@@ -0,0 +1,28 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimingBucket',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url_name', models.CharField(max_length=200)),
+                ('metric', models.CharField(max_length=20)),
+                ('bound', models.CharField(max_length=10)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='timingbucket',
+            constraint=models.UniqueConstraint(fields=('url_name', 'metric', 'bound'), name='timing_bucket'),
+        ),
+    ]
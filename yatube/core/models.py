@@ -0,0 +1,17 @@
+from django.db import models
+
+
+class TimingBucket(models.Model):
+    """Корзина гистограммы замеров: запросов к URL с таким значением."""
+
+    url_name = models.CharField(max_length=200)
+    metric = models.CharField(max_length=20)
+    bound = models.CharField(max_length=10)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["url_name", "metric", "bound"], name="timing_bucket"
+            )
+        ]
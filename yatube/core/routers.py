@@ -0,0 +1,92 @@
+"""Чтение лент из реплики базы.
+
+Представления, помеченные replica_reads, читают из REPLICA_DATABASE, все
+остальные запросы и любые записи идут в default. Реплика отстаёт от
+основной базы, поэтому пользователь, который только что писал, ещё
+REPLICA_STICKY_SECONDS секунд читает из default (cookie ставит
+core.middleware.ReplicaPinMiddleware) и видит свой пост или комментарий.
+"""
+import contextvars
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+PIN_COOKIE = "primary_reads"
+
+_state = contextvars.ContextVar("db_routing", default=None)
+
+
+class RoutingState:
+    """Разметка текущего запроса для роутера."""
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.read_only = False
+        self.wrote = False
+
+    @property
+    def use_replica(self):
+        return self.read_only and not (self.pinned or self.wrote)
+
+
+def begin_request(pinned=False):
+    return _state.set(RoutingState(pinned))
+
+
+def end_request(token):
+    """Снимает разметку запроса и возвращает её."""
+    state = _state.get()
+    _state.reset(token)
+    return state
+
+
+def replica_reads(view):
+    """Помечает представление как только читающее."""
+
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        state = _state.get()
+        if state is None:
+            return view(request, *args, **kwargs)
+        if hasattr(request, "user"):
+            # Сессия и пользователь читаются из основной базы: только что
+            # вошедший пользователь мог ещё не доехать до реплики.
+            request.user.is_authenticated
+        previous, state.read_only = state.read_only, True
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            state.read_only = previous
+
+    return wrapped
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == "django_cache":
+            # Кеш в базе хранит счётчики версий: отставшая реплика
+            # вернула бы старые и показала устаревшие страницы.
+            return None
+        state = _state.get()
+        if settings.REPLICA_DATABASE and state and state.use_replica:
+            return settings.REPLICA_DATABASE
+        return None
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label == "django_cache":
+            # Запись в кеш — не запись данных: реплика остаётся в силе,
+            # а cookie primary_reads не ставится.
+            return DEFAULT_DB_ALIAS
+        state = _state.get()
+        if state is not None:
+            # Дальше в этом запросе читаем своё из основной базы.
+            state.wrote = True
+        # Явно, иначе объект, прочитанный из реплики, сохранился бы в неё.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, settings.REPLICA_DATABASE}
+        if {obj1._state.db, obj2._state.db} <= aliases:
+            return True
+        return None
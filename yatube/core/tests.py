@@ -0,0 +1,302 @@
+import os
+import shutil
+import tempfile
+import time
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.contrib.auth import get_user_model
+from django.db import connection, connections
+from django.test import (
+    Client,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core import timing
+from core import routers
+from core.cache import bump_versions, get_versions
+from core.cache_backends import DatabaseCache, TwoTierCache
+from core.db import apply_pragmas
+from core.models import TimingBucket
+from posts.models import Post
+from posts.tests.utils import OnCommitMixin
+
+User = get_user_model()
+
+
+@override_settings(
+    SERVER_TIMING=True, TIMING_HISTOGRAMS=True, TIMING_FLUSH_SECONDS=0
+)
+class ServerTimingTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_server_timing_header(self):
+        """Ответ содержит замеры SQL, шаблонов и общего времени."""
+        response = self.client.get(reverse("posts:index"))
+        header = response["Server-Timing"]
+        for metric in ("db;dur=", "tpl;dur=", "total;dur="):
+            with self.subTest(metric=metric):
+                self.assertIn(metric, header)
+        self.assertRegex(header, r'desc="[1-9]\d* queries"')
+
+    def test_histograms_by_url_name(self):
+        """Замеры попадают в гистограмму имени URL и в отчёт."""
+        self.client.get(reverse("posts:index"))
+        self.client.get(reverse("about:tech"))
+        self.client.get(reverse("about:tech"))
+        total = timing.histogram("about:tech", "total")
+        self.assertEqual(sum(total.values()), 2)
+        out = StringIO()
+        call_command("timing_report", stdout=out)
+        self.assertIn("posts:index", out.getvalue())
+        self.assertIn("about:tech", out.getvalue())
+        call_command("timing_report", "--reset", stdout=StringIO())
+        self.assertEqual(
+            sum(timing.histogram("about:tech", "total").values()), 0
+        )
+
+    @override_settings(TIMING_FLUSH_SECONDS=60)
+    def test_histograms_flushed_in_batches(self):
+        """Замеры копятся в процессе и пишутся в таблицу пачкой."""
+        timing._flushed_at = time.monotonic()
+        self.client.get(reverse("about:tech"))
+        self.assertFalse(TimingBucket.objects.exists())
+        timing._flushed_at -= 60
+        self.client.get(reverse("about:tech"))
+        total = timing.histogram("about:tech", "total")
+        self.assertEqual(sum(total.values()), 2)
+
+
+class SqlitePragmasTest(TestCase):
+    @override_settings(SQLITE_PRAGMAS={"cache_size": -1234})
+    def test_pragmas_applied_to_connection(self):
+        """PRAGMA из настроек применяются к соединению SQLite."""
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA cache_size")
+            default = cursor.fetchone()[0]
+            apply_pragmas(sender=None, connection=connection)
+            cursor.execute("PRAGMA cache_size")
+            self.assertEqual(cursor.fetchone()[0], -1234)
+            cursor.execute(f"PRAGMA cache_size = {default}")
+
+
+class ReplicaRoutingTest(TransactionTestCase):
+    """Реплика — отдельный файл SQLite без данных основной базы."""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        connections.databases["replica"] = {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.path.join(directory, "replica.sqlite3"),
+        }
+        connections.ensure_defaults("replica")
+        connections.prepare_test_settings("replica")
+        self.addCleanup(self.remove_replica)
+        overrides = override_settings(REPLICA_DATABASE="replica")
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        call_command("migrate", database="replica", verbosity=0)
+        cache.clear()
+        self.author = User.objects.create_user(username="author")
+        self.post = Post.objects.create(author=self.author, text="Из основной")
+        self.client = Client()
+
+    @staticmethod
+    def remove_replica():
+        connections["replica"].close()
+        del connections.databases["replica"]
+        delattr(connections._connections, "replica")
+
+    def test_read_only_views_use_replica(self):
+        """Ленты и страница поста читают из реплики."""
+        response = self.client.get(reverse("posts:index"))
+        self.assertNotContains(response, self.post.text)
+        response = self.client.get(
+            reverse("posts:post_detail", args=(self.post.pk,))
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_author_reads_own_writes(self):
+        """После записи автор какое-то время читает из основной базы."""
+        self.client.force_login(self.author)
+        response = self.client.post(
+            reverse("posts:post_create"), {"text": "Только что"}
+        )
+        self.assertIn(routers.PIN_COOKIE, response.cookies)
+        response = self.client.get(reverse("posts:index"))
+        self.assertContains(response, "Только что")
+        self.assertContains(response, self.post.text)
+        self.client.cookies.pop(routers.PIN_COOKIE)
+        # Кеш лент общий для обеих баз, проверяем само чтение.
+        cache.clear()
+        response = self.client.get(reverse("posts:index"))
+        self.assertNotContains(response, "Только что")
+
+    def test_database_cache_keeps_replica(self):
+        """Запись в кеш из таблицы базы не уводит запрос с реплики."""
+        database_cache = {
+            "default": settings.CACHES["default"],
+            "shared": {
+                "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+                "LOCATION": "cache_entries",
+            },
+        }
+        with override_settings(CACHES=database_cache):
+            call_command("createcachetable", verbosity=0)
+            self.addCleanup(self.drop_cache_table)
+            response = self.client.get(reverse("posts:index"))
+            self.assertNotIn(routers.PIN_COOKIE, response.cookies)
+            self.assertNotContains(response, self.post.text)
+            token = routers.begin_request()
+            try:
+                routers._state.get().read_only = True
+                cache.set("page:test", "страница")
+                cache.add("version:test", 1)
+                self.assertTrue(routers._state.get().use_replica)
+            finally:
+                routers.end_request(token)
+            self.assertEqual(
+                caches["shared"].get("page:test"), "страница"
+            )
+
+    @staticmethod
+    def drop_cache_table():
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TABLE cache_entries")
+
+    def test_versions_bumped_again_after_replica_lag(self):
+        """Страница, собранная из отставшей реплики, потом устаревает."""
+        with mock.patch("core.cache.threading.Timer") as timer:
+            post = Post.objects.create(author=self.author, text="Новый")
+        seconds, delayed_bump, args = timer.call_args[0]
+        self.assertEqual(seconds, settings.REPLICA_STICKY_SECONDS)
+        response = self.client.get(reverse("posts:index"))
+        self.assertNotContains(response, post.text)
+        # Реплика догнала основную базу.
+        User.objects.using("replica").bulk_create([self.author])
+        Post.objects.using("replica").bulk_create([post])
+        response = self.client.get(reverse("posts:index"))
+        self.assertNotContains(response, post.text)
+        delayed_bump(*args)
+        response = self.client.get(reverse("posts:index"))
+        self.assertContains(response, post.text)
+
+    def test_writes_go_to_primary(self):
+        """Записи идут в основную базу, чтения без пометки — тоже."""
+        router = routers.ReplicaRouter()
+        token = routers.begin_request()
+        try:
+            self.assertIsNone(router.db_for_read(Post))
+            routers._state.get().read_only = True
+            self.assertEqual(router.db_for_read(Post), "replica")
+            self.assertEqual(router.db_for_write(Post), "default")
+            self.assertIsNone(router.db_for_read(Post))
+        finally:
+            routers.end_request(token)
+
+
+class TwoTierCacheTest(OnCommitMixin, TestCase):
+    """Два экземпляра над одним общим кешем — как два процесса."""
+
+    def setUp(self):
+        cache.clear()
+        self.workers = [self.make_cache(), self.make_cache()]
+
+    @staticmethod
+    def make_cache(**options):
+        options = {"LOCAL_PREFIXES": ("page:",), **options}
+        return TwoTierCache("", {"OPTIONS": options})
+
+    def test_shared_between_processes(self):
+        """Запись одного процесса видна другому."""
+        first, second = self.workers
+        first.set("page:index", "страница")
+        self.assertEqual(second.get("page:index"), "страница")
+
+    def test_local_tier_serves_repeated_reads(self):
+        """Повторное чтение берётся из LRU процесса."""
+        first, _ = self.workers
+        first.set("page:index", "страница")
+        caches["shared"].delete("page:index")
+        self.assertEqual(first.get("page:index"), "страница")
+
+    def test_only_prefixed_keys_are_local(self):
+        """Ключи без префикса, в том числе версии, всегда из общего кеша."""
+        first, second = self.workers
+        first.set("version:feed", 1)
+        first.set("upload:1", "queued")
+        second.incr("version:feed")
+        second.set("upload:1", "done")
+        self.assertEqual(first.get("version:feed"), 2)
+        self.assertEqual(first.get("upload:1"), "done")
+
+    def test_version_bump_reaches_other_process(self):
+        """Копия страницы в LRU устаревает по счётчику из общего кеша."""
+        first, _ = self.workers
+        first.set("page:index", ("страница", get_versions("feed")))
+        with self.captureOnCommitCallbacks() as callbacks:
+            bump_versions("feed")
+        # До фиксации транзакции читатели видят прежнюю версию.
+        self.assertEqual(first.get("page:index")[1], get_versions("feed"))
+        for callback in callbacks:
+            callback()
+        _, stored = first.get("page:index")
+        self.assertNotEqual(get_versions("feed"), stored)
+
+    def test_lru_eviction_and_timeout(self):
+        """LRU ограничен по числу записей и времени жизни."""
+        small = self.make_cache(LOCAL_MAX_ENTRIES=2)
+        for key in ("page:a", "page:b", "page:c"):
+            small.set(key, key)
+        self.assertEqual(
+            [key for key, _ in small._local], ["page:b", "page:c"]
+        )
+        expired = self.make_cache(LOCAL_TIMEOUT=0)
+        expired.set("page:a", "a")
+        caches["shared"].delete("page:a")
+        self.assertIsNone(expired.get("page:a"))
+
+    def test_values_are_copies(self):
+        """Изменение полученного объекта не портит локальную копию."""
+        first, _ = self.workers
+        first.set("page:index", {"a": 1})
+        first.get("page:index")["a"] = 2
+        self.assertEqual(first.get("page:index"), {"a": 1})
+
+
+class DatabaseCacheTest(TestCase):
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "CREATE TABLE incr_cache (cache_key varchar(255) PRIMARY "
+                "KEY, value text NOT NULL, expires datetime NOT NULL)"
+            )
+        self.cache = DatabaseCache("incr_cache", {})
+
+    def test_incr_locks_row_and_keeps_expiry(self):
+        """incr блокирует строку до чтения и не меняет срок жизни."""
+        self.cache.set("version:feed", 1, timeout=None)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.cache.incr("version:feed", 2), 3)
+        sql = [
+            query["sql"]
+            for query in queries.captured_queries
+            if not query["sql"].startswith(("SAVEPOINT", "RELEASE"))
+        ]
+        self.assertTrue(sql[0].startswith('UPDATE "incr_cache" SET'))
+        self.assertTrue(sql[1].startswith("SELECT"))
+        self.assertEqual(self.cache.get("version:feed"), 3)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT expires FROM incr_cache")
+            self.assertTrue(str(cursor.fetchone()[0]).startswith("9999"))
+        with self.assertRaises(ValueError):
+            self.cache.incr("missing")
@@ -0,0 +1,153 @@
+"""Замеры запросов: SQL, шаблоны, общее время и гистограммы по URL.
+
+Гистограммы копятся в памяти процесса и раз в TIMING_FLUSH_SECONDS
+добавляются в таблицу TimingBucket, поэтому команда timing_report видит
+замеры всех процессов.
+"""
+import contextvars
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F
+from django.template.base import Template
+
+from .models import TimingBucket
+
+DURATION_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+METRICS = {
+    "total": DURATION_BUCKETS,
+    "db": DURATION_BUCKETS,
+    "template": DURATION_BUCKETS,
+    "queries": QUERY_BUCKETS,
+}
+INF = "inf"
+
+_current = contextvars.ContextVar("request_timings", default=None)
+_pending = Counter()
+_flushed_at = time.monotonic()
+_lock = threading.Lock()
+
+
+class RequestTimings:
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.template = 0.0
+        self.rendering = False
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += time.perf_counter() - start
+            self.queries += 1
+
+    def activate(self):
+        return _current.set(self)
+
+    @staticmethod
+    def deactivate(token):
+        _current.reset(token)
+
+
+def install_template_timer():
+    """Оборачивает Template.render, чтобы мерить время отрисовки.
+
+    Учитывается только внешний шаблон: вложенные include уже входят
+    в его время.
+    """
+    render = Template.render
+    if getattr(render, "timed", False):
+        return
+
+    def timed_render(self, context):
+        timings = _current.get()
+        if timings is None or timings.rendering:
+            return render(self, context)
+        timings.rendering = True
+        start = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            timings.template += time.perf_counter() - start
+            timings.rendering = False
+
+    timed_render.timed = True
+    Template.render = timed_render
+
+
+def bucket(value, bounds):
+    for bound in bounds:
+        if value <= bound:
+            return bound
+    return INF
+
+
+def record(url_name, values):
+    """Добавляет замеры запроса в гистограммы URL."""
+    global _flushed_at
+    with _lock:
+        for metric, value in values.items():
+            part = bucket(value, METRICS[metric])
+            _pending[(url_name, metric, str(part))] += 1
+        now = time.monotonic()
+        if now - _flushed_at < settings.TIMING_FLUSH_SECONDS:
+            return
+        counts = dict(_pending)
+        _pending.clear()
+        _flushed_at = now
+    flush(counts)
+
+
+def flush(counts):
+    """Добавляет накопленные счётчики в таблицу.
+
+    Запись идёт в основную базу в обход роутера: иначе замер пометил бы
+    запрос как пишущий и увёл бы его чтения с реплики.
+    """
+    buckets = TimingBucket.objects.using(DEFAULT_DB_ALIAS)
+    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+        buckets.bulk_create(
+            [
+                TimingBucket(url_name=url_name, metric=metric, bound=bound)
+                for url_name, metric, bound in counts
+            ],
+            ignore_conflicts=True,
+        )
+        for (url_name, metric, bound), count in counts.items():
+            buckets.filter(
+                url_name=url_name, metric=metric, bound=bound
+            ).update(count=F("count") + count)
+
+
+def histogram(url_name, metric):
+    """Гистограмма {верхняя граница корзины: число запросов}."""
+    parts = {str(part): part for part in (*METRICS[metric], INF)}
+    found = dict(
+        TimingBucket.objects.filter(
+            url_name=url_name, metric=metric
+        ).values_list("bound", "count")
+    )
+    return {part: found.get(bound, 0) for bound, part in parts.items()}
+
+
+def percentile(hist, fraction):
+    """Верхняя граница корзины, в которую попадает перцентиль."""
+    total = sum(hist.values())
+    if not total:
+        return None
+    seen = 0
+    for part, count in hist.items():
+        seen += count
+        if seen >= total * fraction:
+            return part
+    return INF
+
+
+def reset(url_name):
+    TimingBucket.objects.filter(url_name=url_name).delete()
@@ -0,0 +1,49 @@
+"""Пулы фоновых потоков, по одному на настройку с числом потоков.
+
+Пул создаётся при первой задаче. Если настройка равна 0, задача
+выполняется сразу в вызывающем потоке.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+_executors = {}
+_lock = threading.Lock()
+
+
+def use_workers(setting):
+    return getattr(settings, setting) > 0
+
+
+def get_executor(setting):
+    with _lock:
+        if setting not in _executors:
+            _executors[setting] = ThreadPoolExecutor(
+                max_workers=getattr(settings, setting),
+                thread_name_prefix=setting.lower(),
+            )
+        return _executors[setting]
+
+
+def run(setting, func, *args):
+    """Выполняет func в пуле из settings.<setting> потоков или сразу."""
+    if use_workers(setting):
+        get_executor(setting).submit(_in_worker, func, *args)
+    else:
+        func(*args)
+
+
+def _in_worker(func, *args):
+    try:
+        func(*args)
+    except Exception:
+        # Результат задачи никто не ждёт: ошибка иначе пропала бы молча.
+        logger.exception("Фоновая задача %s не выполнена", func.__name__)
+    finally:
+        # Соединения потока пула иначе остались бы открытыми.
+        connections.close_all()
@@ -1,5 +1,6 @@
 from django.contrib import admin
 
+from . import search
 from .models import Group, Post, Comment, Follow
 
 
@@ -16,6 +17,13 @@ class PostAdmin(admin.ModelAdmin):
     list_editable = ("group",)
     empty_value_display = "-пусто-"
 
+    def get_search_results(self, request, queryset, search_term):
+        # search_fields нужны, чтобы админка показала поле поиска, а сам
+        # поиск идёт по полнотекстовому индексу вместо LIKE по таблице.
+        if search.available() and search.match_expression(search_term):
+            return search.search_posts(queryset, search_term), False
+        return super().get_search_results(request, queryset, search_term)
+
 
 class CommentAdmin(admin.ModelAdmin):
     list_display = (
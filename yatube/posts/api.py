@@ -0,0 +1,252 @@
+"""JSON API лент и страницы поста для мобильных клиентов.
+
+Ответы повторяют HTML-страницы без шаблонов. Пост — плоский словарь,
+автор и группа в нём заданы username и slug, а названия групп вынесены
+в общий словарь groups, чтобы не повторяться в каждом посте. Пагинация
+всегда курсорная, ?fields= выбирает поля постов и сужает SELECT.
+Готовый JSON кешируется по версиям лент (posts.cache.api_cache_key),
+поэтому сбрасывается при тех же записях, что и HTML.
+"""
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import Http404, HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import condition, require_GET
+
+from . import conditional
+from .cache import (
+    INDEX_FEED,
+    api_cache_key,
+    group_feed,
+    post_page,
+    profile_feed,
+)
+from .models import Comment, Group, Post
+from .paginator import CommentPaginator, CursorPaginator
+from .stats import get_stats
+from .timeline import TimelinePaginator
+
+User = get_user_model()
+
+# Поле поста -> (колонки для only(), значение в JSON).
+POST_FIELDS = {
+    "id": ((), lambda post: post.pk),
+    "text": (("text",), lambda post: post.text),
+    "pub_date": (("pub_date",), lambda post: post.pub_date.isoformat()),
+    "author": (("author__username",), lambda post: post.author.username),
+    "group": (
+        ("group__slug", "group__title"),
+        lambda post: post.group.slug if post.group_id else None,
+    ),
+    "image": (
+        ("image",),
+        lambda post: post.image.url if post.image else None,
+    ),
+    "comments_count": (
+        ("comments_count",),
+        lambda post: post.comments_count,
+    ),
+}
+
+
+class FieldsError(ValueError):
+    pass
+
+
+def requested_fields(request):
+    raw = request.GET.get("fields")
+    if not raw:
+        return tuple(POST_FIELDS)
+    fields = tuple(
+        dict.fromkeys(name.strip() for name in raw.split(",") if name.strip())
+    )
+    unknown = [name for name in fields if name not in POST_FIELDS]
+    if unknown:
+        raise FieldsError(f"Неизвестные поля: {', '.join(unknown)}")
+    return fields
+
+
+def select_fields(queryset, fields):
+    """Читает из базы только колонки выбранных полей."""
+    # pub_date нужна курсору, даже если поле не запрошено.
+    columns = ["pub_date"]
+    for name in fields:
+        columns.extend(POST_FIELDS[name][0])
+    relations = {column.split("__")[0] for column in columns if "__" in column}
+    queryset = queryset.select_related(None)
+    if relations:
+        queryset = queryset.select_related(*relations)
+    return queryset.only(*columns)
+
+
+def serialize_post(post, fields):
+    return {name: POST_FIELDS[name][1](post) for name in fields}
+
+
+def serialize_groups(posts, fields):
+    if "group" not in fields:
+        return {}
+    return {
+        post.group.slug: {"title": post.group.title}
+        for post in posts
+        if post.group_id
+    }
+
+
+def posts_page(request, queryset, fields, paginator=CursorPaginator, **kwargs):
+    page = paginator(
+        select_fields(queryset, fields), settings.PAR_PAGE, **kwargs
+    ).get_page(request.GET.get("cursor"))
+    return {
+        "results": [serialize_post(post, fields) for post in page],
+        "groups": serialize_groups(page, fields),
+        "next": page.next_cursor,
+        "previous": page.previous_cursor,
+    }
+
+
+def cached_json(key, build):
+    """JSON из кеша или собранный build() и сохранённый в кеш."""
+    content = cache.get(key)
+    if content is None:
+        content = json.dumps(
+            build(), ensure_ascii=False, separators=(",", ":")
+        )
+        cache.set(key, content, settings.FEED_CACHE_TIMEOUT)
+    return HttpResponse(content, content_type="application/json")
+
+
+def api_view(etag_func, last_modified_func, login=False):
+    """GET, ETag/Last-Modified страницы, gzip и ошибки в JSON.
+
+    login=True отвечает 401 анонимным пользователям вместо
+    перенаправления на страницу входа.
+    """
+
+    def decorator(view):
+        def handle(request, *args, **kwargs):
+            try:
+                return view(request, *args, **kwargs)
+            except FieldsError as error:
+                return JsonResponse({"detail": str(error)}, status=400)
+            except Http404:
+                return JsonResponse({"detail": "Не найдено"}, status=404)
+
+        conditional_view = condition(etag_func, last_modified_func)(handle)
+
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if login and not request.user.is_authenticated:
+                return JsonResponse(
+                    {"detail": "Требуется авторизация"}, status=401
+                )
+            return conditional_view(request, *args, **kwargs)
+
+        return gzip_page(require_GET(wrapped))
+
+    return decorator
+
+
+@api_view(conditional.index_etag, conditional.index_last_modified)
+def index(request):
+    fields = requested_fields(request)
+    return cached_json(
+        api_cache_key(request, INDEX_FEED),
+        lambda: posts_page(request, Post.objects.all(), fields),
+    )
+
+
+@api_view(conditional.group_etag, conditional.group_last_modified)
+def group_posts(request, slug):
+    fields = requested_fields(request)
+    group = get_object_or_404(Group, slug=slug)
+
+    def build():
+        return {
+            "group": {
+                "slug": group.slug,
+                "title": group.title,
+                "description": group.description,
+            },
+            **posts_page(request, group.posts.all(), fields),
+        }
+
+    return cached_json(api_cache_key(request, group_feed(group.id)), build)
+
+
+@api_view(conditional.profile_etag, conditional.profile_last_modified)
+def profile(request, username):
+    fields = requested_fields(request)
+    author = get_object_or_404(
+        User.objects.select_related("stats"), username=username
+    )
+
+    def build():
+        stats = get_stats(author)
+        return {
+            "author": {
+                "username": author.username,
+                "name": author.get_full_name(),
+                "posts_count": stats.posts_count,
+                "followers_count": stats.followers_count,
+                "following_count": stats.following_count,
+            },
+            **posts_page(request, author.posts.all(), fields),
+        }
+
+    return cached_json(api_cache_key(request, profile_feed(author.id)), build)
+
+
+@api_view(conditional.follow_etag, conditional.follow_last_modified, True)
+def follow_index(request):
+    fields = requested_fields(request)
+    if settings.FOLLOW_TIMELINE:
+        options = {"paginator": TimelinePaginator, "user": request.user}
+        posts = Post.objects.all()
+    else:
+        options = {}
+        posts = Post.objects.filter(author__following__user=request.user)
+    key = api_cache_key(
+        request, INDEX_FEED, profile_feed(request.user.pk), personal=True
+    )
+    return cached_json(
+        key, lambda: posts_page(request, posts, fields, **options)
+    )
+
+
+@api_view(conditional.post_etag, conditional.post_last_modified)
+def post_detail(request, post_id):
+    fields = requested_fields(request)
+
+    def build():
+        post = get_object_or_404(
+            select_fields(Post.objects.all(), fields), id=post_id
+        )
+        comments = CommentPaginator(
+            Comment.objects.filter(post_id=post_id)
+            .select_related("author")
+            .only("text", "created", "author__username"),
+            settings.COMMENTS_PAR_PAGE,
+        ).get_page(request.GET.get("cursor"))
+        return {
+            "post": serialize_post(post, fields),
+            "groups": serialize_groups([post], fields),
+            "comments": [
+                {
+                    "id": comment.pk,
+                    "author": comment.author.username,
+                    "text": comment.text,
+                    "created": comment.created.isoformat(),
+                }
+                for comment in comments
+            ],
+            "next": comments.next_cursor,
+            "previous": comments.previous_cursor,
+        }
+
+    return cached_json(api_cache_key(request, post_page(post_id)), build)
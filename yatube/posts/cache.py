@@ -0,0 +1,68 @@
+import hashlib
+
+from django.conf import settings
+
+from core.cache import get_versions
+
+ALL_FEEDS = "feed"
+INDEX_FEED = "feed:index"
+
+
+def group_feed(group_id):
+    return f"feed:group:{group_id}"
+
+
+def profile_feed(author_id):
+    return f"feed:profile:{author_id}"
+
+
+def post_page(post_id):
+    return f"post:{post_id}"
+
+
+def post_scopes(post):
+    """Ленты и страница поста, в которых он показывается."""
+    scopes = [INDEX_FEED, profile_feed(post.author_id), post_page(post.pk)]
+    if post.group_id:
+        scopes.append(group_feed(post.group_id))
+    return scopes
+
+
+def feed_cache_context(request, feed):
+    """Ключ фрагмента ленты: лента, её версия, страница и пользователь.
+
+    Карточка поста зависит от пользователя (кнопка «Редактировать»),
+    поэтому фрагмент кешируется отдельно для каждого пользователя.
+    """
+    versions = get_versions(ALL_FEEDS, feed)
+    key = ":".join(
+        [
+            feed,
+            str(versions[ALL_FEEDS]),
+            str(versions[feed]),
+            request.GET.urlencode(),
+            str(request.user.pk),
+        ]
+    )
+    return {
+        "feed_cache_key": key,
+        "feed_cache_timeout": settings.FEED_CACHE_TIMEOUT,
+    }
+
+
+def api_cache_key(request, *scopes, personal=False):
+    """Ключ готового JSON API: путь, версии лент и строка запроса.
+
+    JSON не зависит от шаблонов и пользователя, кроме личных лент,
+    поэтому кешируется отдельно от фрагментов HTML.
+    """
+    versions = get_versions(ALL_FEEDS, *scopes)
+    parts = [
+        request.path,
+        *(f"{name}={version}" for name, version in sorted(versions.items())),
+        request.GET.urlencode(),
+    ]
+    if personal:
+        parts.append(str(request.user.pk))
+    digest = hashlib.md5(":".join(parts).encode()).hexdigest()
+    return f"api:{digest}"
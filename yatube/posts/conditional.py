@@ -0,0 +1,103 @@
+"""Валидаторы ETag и Last-Modified для лент и страницы поста.
+
+Оба валидатора строятся по ключам кеша (см. posts.cache): ETag — из их
+версий, строки запроса и пользователя, Last-Modified — из времени
+последнего сброса версий (core.cache.last_changed). Поэтому правка и
+удаление поста меняют и то и другое. Для группы, профиля и поста нужен
+один запрос по уникальному ключу, чтобы узнать id группы или автора,
+остальные валидаторы обходятся без базы.
+"""
+import hashlib
+
+from django.contrib.auth import get_user_model
+
+from core.cache import get_versions, last_changed
+
+from .cache import ALL_FEEDS, INDEX_FEED, group_feed, post_page, profile_feed
+from .models import Group, Post
+
+User = get_user_model()
+
+
+def make_etag(request, *scopes):
+    versions = sorted(get_versions(ALL_FEEDS, *scopes).items())
+    raw = ":".join(
+        [
+            *(f"{name}={version}" for name, version in versions),
+            request.GET.urlencode(),
+            str(request.user.pk),
+        ]
+    )
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def make_last_modified(*scopes):
+    return last_changed(ALL_FEEDS, *scopes)
+
+
+def group_scope(slug):
+    group_id = Group.objects.filter(slug=slug).values_list("id", flat=True)
+    return group_feed(group_id.first())
+
+
+def profile_scope(username):
+    author_id = (
+        User.objects.filter(username=username)
+        .values_list("id", flat=True)
+        .first()
+    )
+    return profile_feed(author_id)
+
+
+def post_scopes(post_id):
+    author_id = (
+        Post.objects.filter(pk=post_id)
+        .values_list("author_id", flat=True)
+        .first()
+    )
+    return post_page(post_id), profile_feed(author_id)
+
+
+def follow_scopes(request):
+    # Лента подписок меняется вместе с любым постом и подписками читателя.
+    return INDEX_FEED, profile_feed(request.user.pk)
+
+
+def index_etag(request):
+    return make_etag(request, INDEX_FEED)
+
+
+def index_last_modified(request):
+    return make_last_modified(INDEX_FEED)
+
+
+def group_etag(request, slug):
+    return make_etag(request, group_scope(slug))
+
+
+def group_last_modified(request, slug):
+    return make_last_modified(group_scope(slug))
+
+
+def profile_etag(request, username):
+    return make_etag(request, profile_scope(username))
+
+
+def profile_last_modified(request, username):
+    return make_last_modified(profile_scope(username))
+
+
+def follow_etag(request):
+    return make_etag(request, *follow_scopes(request))
+
+
+def follow_last_modified(request):
+    return make_last_modified(*follow_scopes(request))
+
+
+def post_etag(request, post_id):
+    return make_etag(request, *post_scopes(post_id))
+
+
+def post_last_modified(request, post_id):
+    return make_last_modified(*post_scopes(post_id))
@@ -0,0 +1,139 @@
+"""RSS и Atom для общей ленты, групп и авторов.
+
+Посты берутся теми же запросами по индексам, что и в лентах. Ответ
+помечается ключами лент, поэтому кеш страниц анонимных пользователей
+держит его до нового поста в этой ленте, а валидаторы страниц (см.
+posts.conditional) превращают повторный опрос в ответ 304.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.syndication.views import Feed
+from django.shortcuts import get_object_or_404
+from django.template.defaultfilters import linebreaksbr, truncatechars
+from django.urls import reverse
+from django.utils.feedgenerator import Atom1Feed
+from django.views.decorators.http import condition
+
+from core.cache import add_surrogate_keys
+
+from . import conditional
+from .cache import ALL_FEEDS, INDEX_FEED, group_feed, profile_feed
+from .models import Group, Post
+
+User = get_user_model()
+
+
+class PostsFeed(Feed):
+    """Общие поля записи ленты для всех каналов."""
+
+    def item_title(self, post):
+        return truncatechars(post.text, 50)
+
+    def item_description(self, post):
+        return linebreaksbr(post.text)
+
+    def item_link(self, post):
+        return reverse("posts:post_detail", args=(post.pk,))
+
+    def item_pubdate(self, post):
+        return post.pub_date
+
+    def item_author_name(self, post):
+        return post.author.username
+
+    def item_categories(self, post):
+        return (post.group.title,) if post.group_id else ()
+
+    def latest(self, queryset):
+        return queryset.for_feed()[:settings.SYNDICATION_ITEMS]
+
+
+class LatestPostsFeed(PostsFeed):
+    title = "Yatube: последние записи"
+    description = "Последние обновления на сайте"
+
+    def get_object(self, request):
+        add_surrogate_keys(request, ALL_FEEDS, INDEX_FEED)
+
+    def link(self):
+        return reverse("posts:index")
+
+    def items(self):
+        return self.latest(Post.objects.all())
+
+
+class LatestPostsAtomFeed(LatestPostsFeed):
+    feed_type = Atom1Feed
+    subtitle = LatestPostsFeed.description
+
+
+class GroupPostsFeed(PostsFeed):
+    def get_object(self, request, slug):
+        group = get_object_or_404(Group, slug=slug)
+        add_surrogate_keys(request, ALL_FEEDS, group_feed(group.id))
+        return group
+
+    def title(self, group):
+        return f"Yatube: записи сообщества {group}"
+
+    def description(self, group):
+        return group.description
+
+    def link(self, group):
+        return reverse("posts:group_posts", args=(group.slug,))
+
+    def items(self, group):
+        return self.latest(group.posts.all())
+
+
+class GroupPostsAtomFeed(GroupPostsFeed):
+    feed_type = Atom1Feed
+
+    def subtitle(self, group):
+        return group.description
+
+
+class AuthorPostsFeed(PostsFeed):
+    def get_object(self, request, username):
+        author = get_object_or_404(User, username=username)
+        add_surrogate_keys(request, ALL_FEEDS, profile_feed(author.id))
+        return author
+
+    def title(self, author):
+        return f"Yatube: записи {author.username}"
+
+    def description(self, author):
+        return f"Записи пользователя {author.username}"
+
+    def link(self, author):
+        return reverse("posts:profile", args=(author.username,))
+
+    def items(self, author):
+        return self.latest(author.posts.all())
+
+
+class AuthorPostsAtomFeed(AuthorPostsFeed):
+    feed_type = Atom1Feed
+
+    def subtitle(self, author):
+        return self.description(author)
+
+
+index_rss = condition(
+    conditional.index_etag, conditional.index_last_modified
+)(LatestPostsFeed())
+index_atom = condition(
+    conditional.index_etag, conditional.index_last_modified
+)(LatestPostsAtomFeed())
+group_rss = condition(
+    conditional.group_etag, conditional.group_last_modified
+)(GroupPostsFeed())
+group_atom = condition(
+    conditional.group_etag, conditional.group_last_modified
+)(GroupPostsAtomFeed())
+profile_rss = condition(
+    conditional.profile_etag, conditional.profile_last_modified
+)(AuthorPostsFeed())
+profile_atom = condition(
+    conditional.profile_etag, conditional.profile_last_modified
+)(AuthorPostsAtomFeed())
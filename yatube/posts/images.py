@@ -0,0 +1,64 @@
+"""Счётчики ссылок на файлы картинок постов.
+
+Одинаковые картинки хранятся одним файлом (posts.storage), поэтому
+файл нельзя удалить вместе с постом. StoredImage считает посты с этой
+картинкой; счётчик меняется в сигналах Post, а когда он доходит до
+нуля, после фиксации транзакции удаляются файл, его миниатюры и записи
+ImageVariant. Расхождения чинит команда recount_stats.
+"""
+import logging
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from sorl.thumbnail import delete as delete_thumbnails
+
+from .models import ImageVariant, Post, StoredImage
+
+logger = logging.getLogger(__name__)
+
+
+def retain(name):
+    if not name:
+        return
+    _, created = StoredImage.objects.get_or_create(
+        name=name, defaults={"refs": 1}
+    )
+    if not created:
+        StoredImage.objects.filter(name=name).update(refs=F("refs") + 1)
+
+
+def release(name):
+    if not name:
+        return
+    StoredImage.objects.filter(name=name, refs__gt=0).update(
+        refs=F("refs") - 1
+    )
+    deleted, _ = StoredImage.objects.filter(name=name, refs=0).delete()
+    if deleted:
+        transaction.on_commit(lambda: remove_files(name))
+
+
+def remove_files(name):
+    """Удаляет файл картинки и всё, что из него построено.
+
+    Запись StoredImage с refs=0 служит блокировкой: её вставка ждёт
+    незафиксированную вставку той же картинки, а после фиксации чужой
+    даёт IntegrityError, и тогда файл не трогается. Загрузка, которая
+    застала файл и потеряла его, кладёт его заново (uploads.process).
+    """
+    try:
+        with transaction.atomic():
+            StoredImage.objects.create(name=name, refs=0)
+            try:
+                delete_thumbnails(name, delete_file=False)
+                Post._meta.get_field("image").storage.delete(name)
+            except (OSError, SuspiciousFileOperation):
+                # Имя могли записать в обход формы, в том числе вне
+                # MEDIA_ROOT.
+                logger.exception("Не удалось удалить картинку %s", name)
+            ImageVariant.objects.filter(source=name).delete()
+            StoredImage.objects.filter(name=name).delete()
+    except IntegrityError:
+        # Ту же картинку успели загрузить заново.
+        return
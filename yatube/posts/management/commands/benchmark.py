@@ -0,0 +1,177 @@
+import json
+import statistics
+import subprocess
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Follow, Group, Post
+from posts.urls import app_name, urlpatterns
+
+User = get_user_model()
+
+FEEDS = ("index", "group_posts", "profile", "follow_index")
+POST_URLS = ("add_comment",)
+QUERY_STRINGS = {"search": "q=пост"}
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Прогоняет все URL из posts.urls через тестовый клиент и сохраняет "
+        "p50/p95, число SQL-запросов и пропускную способность в JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=50)
+        parser.add_argument(
+            "--page",
+            help="Страница лент (?page= или ?cursor=) для глубоких страниц.",
+        )
+        parser.add_argument(
+            "--cold",
+            action="store_true",
+            help="Очищать кеш перед каждым запросом.",
+        )
+        parser.add_argument(
+            "--anonymous",
+            action="store_true",
+            help="Открытые страницы запрашивать без авторизации.",
+        )
+        parser.add_argument("--output", help="Файл для результатов в JSON.")
+        parser.add_argument(
+            "--compare", help="JSON прошлого прогона для сравнения."
+        )
+
+    def targets(self):
+        group = (
+            Group.objects.annotate(size=Count("posts")).order_by("-size")
+        ).first()
+        reader = (
+            User.objects.annotate(size=Count("follower")).order_by("-size")
+        ).first()
+        post = (
+            Post.objects.annotate(size=Count("comments")).order_by("-size")
+        ).first()
+        if group is None or reader is None or post is None:
+            raise CommandError("Нет данных: сначала выполните seed_data.")
+        author = post.author
+        follow = reader.follower.select_related("author").first()
+        if follow is None:
+            self.stdout.write(
+                self.style.WARNING(
+                    "Подписок нет: лента подписок пуста, отписка и "
+                    "подписка меряются на авторе самого обсуждаемого поста."
+                )
+            )
+        elif not Follow.objects.filter(user=reader, author=author).exists():
+            author = follow.author
+        self.reader = reader
+        kwargs = {
+            "slug": group.slug,
+            "username": author.username,
+            "post_id": post.pk,
+        }
+        targets = {}
+        for pattern in urlpatterns:
+            params = {
+                name: kwargs[name] for name in pattern.pattern.converters
+            }
+            url = reverse(f"{app_name}:{pattern.name}", kwargs=params)
+            if pattern.name in QUERY_STRINGS:
+                url = f"{url}?{QUERY_STRINGS[pattern.name]}"
+            targets[pattern.name] = url
+        return targets
+
+    def measure(self, name, url, options):
+        client = Client()
+        if not options["anonymous"] or name not in FEEDS + ("post_detail",):
+            client.force_login(self.reader)
+        if name in FEEDS and options["page"]:
+            url = f"{url}?{options['page']}"
+        latencies, queries, statuses = [], [], set()
+        started = time.perf_counter()
+        for _ in range(options["requests"]):
+            if options["cold"]:
+                cache.clear()
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                if name in POST_URLS:
+                    response = client.post(url, {"text": "Замер"})
+                else:
+                    response = client.get(url)
+                latencies.append((time.perf_counter() - start) * 1000)
+            queries.append(len(captured))
+            statuses.add(response.status_code)
+        elapsed = time.perf_counter() - started
+        return {
+            "url": url,
+            "status": sorted(statuses),
+            "p50_ms": round(statistics.median(latencies), 2),
+            "p95_ms": round(percentile(latencies, 0.95), 2),
+            "queries_p50": statistics.median(queries),
+            "queries_max": max(queries),
+            "rps": round(options["requests"] / elapsed, 1),
+        }
+
+    def handle(self, *args, **options):
+        results = {
+            name: self.measure(name, url, options)
+            for name, url in self.targets().items()
+        }
+        report = {
+            "commit": current_commit(),
+            "options": {
+                key: options[key]
+                for key in ("requests", "page", "cold", "anonymous")
+            },
+            "counts": {
+                "users": User.objects.count(),
+                "posts": Post.objects.count(),
+                "follows": Follow.objects.count(),
+            },
+            "results": results,
+        }
+        previous = {}
+        if options["compare"]:
+            with open(options["compare"], encoding="utf-8") as file:
+                previous = json.load(file)["results"]
+        self.stdout.write(
+            f"{'url':<18}{'p50 ms':>10}{'p95 ms':>10}{'queries':>9}"
+            f"{'rps':>9}{'Δp50':>9}"
+        )
+        for name, result in results.items():
+            delta = ""
+            if name in previous:
+                delta = f"{result['p50_ms'] - previous[name]['p50_ms']:+.1f}"
+            self.stdout.write(
+                f"{name:<18}{result['p50_ms']:>10}{result['p95_ms']:>10}"
+                f"{result['queries_max']:>9}{result['rps']:>9}{delta:>9}"
+            )
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
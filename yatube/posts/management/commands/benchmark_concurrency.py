@@ -0,0 +1,198 @@
+import json
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from posts.management.commands.benchmark import percentile
+from posts.models import Comment, Post
+
+User = get_user_model()
+
+JOURNAL_MODES = ("delete", "wal")
+
+
+def read_feed(path, sql, params, deadline):
+    """Читает ленту в отдельном процессе до deadline, задержки в мс."""
+    latencies, errors = [], 0
+    database = sqlite3.connect(path, timeout=20)
+    try:
+        while time.time() < deadline:
+            start = time.perf_counter()
+            try:
+                database.execute(sql, params).fetchall()
+            except sqlite3.OperationalError:
+                errors += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+    finally:
+        database.close()
+    return latencies, errors
+
+
+def write_comments(path, sql, params, hold, deadline):
+    """Пишет комментарии, держа EXCLUSIVE-блокировку hold секунд."""
+    writes, errors = 0, 0
+    database = sqlite3.connect(path, timeout=20, isolation_level=None)
+    try:
+        while time.time() < deadline:
+            try:
+                # Так же блокирует базу большая транзакция, когда её
+                # страницы пишутся на диск при фиксации.
+                database.execute("BEGIN EXCLUSIVE")
+                database.execute(sql, params)
+                time.sleep(hold)
+                database.execute("COMMIT")
+                writes += 1
+            except sqlite3.OperationalError:
+                errors += 1
+                if database.in_transaction:
+                    database.execute("ROLLBACK")
+            # Пауза между транзакциями, чтобы читатели успели войти.
+            time.sleep(hold)
+    finally:
+        database.close()
+    return writes, errors
+
+
+class Command(BaseCommand):
+    help = (
+        "Читает ленту в нескольких процессах, пока другой процесс пишет "
+        "комментарии под EXCLUSIVE-блокировкой, и сообщает задержки "
+        "чтения для журнала отката и WAL рядом. Каждый режим меряется "
+        "на свежей копии базы, сама база не меняется."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--readers", type=int, default=4)
+        parser.add_argument(
+            "--duration", type=float, default=5.0, help="Секунды на режим."
+        )
+        parser.add_argument(
+            "--write-hold",
+            type=float,
+            default=20.0,
+            help="Сколько миллисекунд писатель держит блокировку.",
+        )
+        parser.add_argument(
+            "--modes",
+            default=",".join(JOURNAL_MODES),
+            help="Режимы журнала через запятую.",
+        )
+        parser.add_argument("--output", help="Файл для результатов в JSON.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("Замер рассчитан на SQLite.")
+        if connection.in_atomic_block:
+            # Копия базы ждала бы конца транзакции бесконечно.
+            raise CommandError("Замер нельзя запускать внутри транзакции.")
+        modes = [mode.strip().lower() for mode in options["modes"].split(",")]
+        post = Post.objects.order_by("-pk").first()
+        author = User.objects.order_by("pk").first()
+        if post is None or author is None:
+            raise CommandError("Нет данных: сначала выполните seed_data.")
+        feed = Post.objects.for_feed()[:settings.PAR_PAGE]
+        read_sql, read_params = feed.query.sql_with_params()
+        write_sql, write_params = self.insert_comment(post, author)
+        directory = tempfile.mkdtemp()
+        try:
+            results = {
+                mode: self.measure(
+                    self.copy_database(directory, mode),
+                    (read_sql.replace("%s", "?"), read_params),
+                    (write_sql, write_params),
+                    options,
+                )
+                for mode in modes
+            }
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+        self.report(results)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
+
+    @staticmethod
+    def insert_comment(post, author):
+        columns = [
+            Comment._meta.get_field(name).column
+            for name in ("post", "author", "text", "created")
+        ]
+        placeholders = ", ".join("?" for _ in columns)
+        sql = (
+            f"INSERT INTO {Comment._meta.db_table} ({', '.join(columns)}) "
+            f"VALUES ({placeholders})"
+        )
+        created = connection.ops.adapt_datetimefield_value(timezone.now())
+        return sql, (post.pk, author.pk, "Замер записи", created)
+
+    @staticmethod
+    def copy_database(directory, mode):
+        """Копия базы с явно заданным режимом журнала.
+
+        Режим WAL сохраняется в файле базы, поэтому каждый режим
+        меряется на своей копии и замеры не влияют друг на друга.
+        """
+        connection.ensure_connection()
+        path = os.path.join(directory, f"{mode}.sqlite3")
+        copy = sqlite3.connect(path)
+        try:
+            connection.connection.backup(copy)
+            actual = copy.execute(f"PRAGMA journal_mode={mode}").fetchone()
+        finally:
+            copy.close()
+        if actual[0] != mode:
+            raise CommandError(f"SQLite не включил режим журнала {mode}.")
+        return path
+
+    @staticmethod
+    def measure(path, read, write, options):
+        # Процессы, а не потоки: иначе задержки мерили бы борьбу за GIL.
+        context = multiprocessing.get_context("fork")
+        deadline = time.time() + options["duration"]
+        hold = options["write_hold"] / 1000
+        with context.Pool(options["readers"] + 1) as pool:
+            readers = [
+                pool.apply_async(read_feed, (path, *read, deadline))
+                for _ in range(options["readers"])
+            ]
+            writer = pool.apply_async(
+                write_comments, (path, *write, hold, deadline)
+            )
+            reads = [reader.get() for reader in readers]
+            writes, write_errors = writer.get()
+        latencies = [value for result, _ in reads for value in result]
+        if not latencies:
+            raise CommandError("Читатели не успели прочитать ленту.")
+        return {
+            "readers": options["readers"],
+            "write_hold_ms": options["write_hold"],
+            "reads": len(latencies),
+            "reads_per_s": round(len(latencies) / options["duration"]),
+            "read_errors": sum(errors for _, errors in reads),
+            "writes": writes,
+            "write_errors": write_errors,
+            "p50_ms": round(percentile(latencies, 0.5), 2),
+            "p95_ms": round(percentile(latencies, 0.95), 2),
+            "p99_ms": round(percentile(latencies, 0.99), 2),
+            "max_ms": round(max(latencies), 2),
+            "mean_ms": round(statistics.mean(latencies), 2),
+        }
+
+    def report(self, results):
+        modes = list(results)
+        self.stdout.write(
+            f"{'':>14}" + "".join(f"{mode:>12}" for mode in modes)
+        )
+        for key in next(iter(results.values()), {}):
+            values = "".join(f"{results[mode][key]:>12}" for mode in modes)
+            self.stdout.write(f"{key:>14}{values}")
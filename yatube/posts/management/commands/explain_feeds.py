@@ -0,0 +1,63 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from posts.models import Comment, Group, Post, TimelineEntry
+from posts.paginator import seek
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Показывает планы запросов лент для самых наполненных группы, "
+        "автора, читателя и поста."
+    )
+
+    def feeds(self):
+        group = (
+            Group.objects.annotate(size=Count("posts")).order_by("-size")
+        ).first()
+        author = (
+            User.objects.annotate(size=Count("posts")).order_by("-size")
+        ).first()
+        reader = (
+            User.objects.annotate(size=Count("follower")).order_by("-size")
+        ).first()
+        post = (
+            Post.objects.annotate(size=Count("comments")).order_by("-size")
+        ).first()
+        feeds = {"index": Post.objects.for_feed()}
+        if group is not None:
+            feeds["group_posts"] = group.posts.for_feed()
+        if author is not None:
+            feeds["profile"] = author.posts.for_feed()
+        if reader is not None:
+            feeds["follow_index"] = Post.objects.for_feed().filter(
+                author__following__user=reader
+            )
+            feeds["follow_index (timeline)"] = seek(
+                TimelineEntry.objects.filter(user=reader),
+                "pub_date",
+                None,
+                True,
+                pk="post_id",
+            ).values("post_id", "pub_date")
+            feeds["follow_index (timeline, author)"] = seek(
+                Post.objects.filter(author=author), "pub_date", None, True
+            ).values("pk", "pub_date")
+        if post is not None:
+            feeds["post_detail comments"] = Comment.objects.filter(
+                post=post
+            ).order_by("created")
+        return feeds
+
+    def handle(self, *args, **options):
+        for name, queryset in self.feeds().items():
+            if queryset.model is Post:
+                queryset = queryset.order_by("-pub_date", "-pk")
+            plan = queryset[:settings.PAR_PAGE].explain()
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(plan)
+            self.stdout.write("")
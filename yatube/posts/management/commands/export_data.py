@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from posts.transfer import (
+    FORMATS,
+    SPECS,
+    export_rows,
+    guess_format,
+    write_records,
+)
+
+
+class Command(BaseCommand):
+    help = "Выгружает группы, посты, комментарии или подписки в JSONL/CSV."
+
+    def add_arguments(self, parser):
+        parser.add_argument("model", choices=SPECS)
+        parser.add_argument(
+            "path", nargs="?", default="-", help="Файл; по умолчанию stdout."
+        )
+        parser.add_argument("--format", choices=FORMATS)
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or guess_format(path)
+        batch_size = options["batch_size"]
+        rows, fields = export_rows(options["model"])
+        rows = rows.iterator(chunk_size=batch_size)
+        if path == "-":
+            self.stdout.ending = ""
+            written = self.export(self.stdout, fmt, fields, rows, batch_size)
+        else:
+            with open(path, "w", encoding="utf-8", newline="") as file:
+                written = self.export(file, fmt, fields, rows, batch_size)
+        self.stderr.write(
+            self.style.SUCCESS(f"{options['model']}: выгружено {written}")
+        )
+
+    def export(self, file, fmt, fields, rows, batch_size):
+        written = 0
+        for written in write_records(file, fmt, fields, rows):
+            if written % batch_size == 0:
+                self.stderr.write(f"Выгружено {written}")
+        return written
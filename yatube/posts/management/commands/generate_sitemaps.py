@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import sitemaps
+
+
+class Command(BaseCommand):
+    help = (
+        "Обновляет статические карты сайта: переписывает только файлы, "
+        "в которых изменились адреса или даты."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--base-url",
+            default=settings.SITE_URL,
+            help="Адрес сайта для абсолютных ссылок.",
+        )
+        parser.add_argument("--chunk-size", type=int)
+        parser.add_argument(
+            "--force", action="store_true", help="Переписать все файлы."
+        )
+
+    def handle(self, *args, **options):
+        written = sitemaps.generate(
+            options["base_url"],
+            chunk_size=options["chunk_size"],
+            force=options["force"],
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f"Переписано файлов карты сайта: {written}")
+        )
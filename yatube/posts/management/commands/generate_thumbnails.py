@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = "Создаёт недостающие миниатюры картинок постов."
+
+    def handle(self, *args, **options):
+        created = 0
+        images = (
+            Post.objects.exclude(image="")
+            .values_list("image", flat=True)
+            .distinct()
+        )
+        for name in images.iterator():
+            if thumbnails.missing_variants(name):
+                thumbnails.generate(name)
+                created += 1
+        self.stdout.write(self.style.SUCCESS(f"Создано миниатюр: {created}"))
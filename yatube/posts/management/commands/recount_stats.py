@@ -0,0 +1,135 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from posts import images
+from posts.models import Comment, Follow, Post, StoredImage, UserStats
+
+User = get_user_model()
+
+FIELDS = ("posts_count", "followers_count", "following_count")
+
+
+def grouped_counts(queryset, field, user_ids):
+    return dict(
+        queryset.filter(**{f"{field}__in": user_ids})
+        .values_list(field)
+        .annotate(Count("pk"))
+        .order_by()
+    )
+
+
+def batches(ids, size):
+    batch = []
+    for pk in ids.iterator():
+        batch.append(pk)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает счётчики профилей, комментариев постов и ссылок "
+        "на картинки и чинит расхождения."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Только показать число расхождений.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        dry_run = options["dry_run"]
+        user_ids = User.objects.order_by("pk").values_list("pk", flat=True)
+        drifted = sum(
+            self.repair(batch, dry_run)
+            for batch in batches(user_ids, batch_size)
+        )
+        post_ids = Post.objects.order_by("pk").values_list("pk", flat=True)
+        drifted += sum(
+            self.repair_comments(batch, dry_run)
+            for batch in batches(post_ids, batch_size)
+        )
+        drifted += self.repair_images(dry_run)
+        self.stdout.write(self.style.SUCCESS(f"Расхождений: {drifted}"))
+
+    def repair(self, user_ids, dry_run):
+        posts = grouped_counts(Post.objects, "author_id", user_ids)
+        followers = grouped_counts(Follow.objects, "author_id", user_ids)
+        following = grouped_counts(Follow.objects, "user_id", user_ids)
+        existing = UserStats.objects.in_bulk(user_ids)
+        to_create, to_update = [], []
+        for user_id in user_ids:
+            actual = UserStats(
+                user_id=user_id,
+                posts_count=posts.get(user_id, 0),
+                followers_count=followers.get(user_id, 0),
+                following_count=following.get(user_id, 0),
+            )
+            stored = existing.get(user_id)
+            if stored is None:
+                to_create.append(actual)
+            elif any(
+                getattr(stored, field) != getattr(actual, field)
+                for field in FIELDS
+            ):
+                to_update.append(actual)
+        if not dry_run:
+            with transaction.atomic():
+                UserStats.objects.bulk_create(to_create)
+                UserStats.objects.bulk_update(to_update, FIELDS)
+        return len(to_update)
+
+    def repair_comments(self, post_ids, dry_run):
+        comments = grouped_counts(Comment.objects, "post_id", post_ids)
+        stored = (
+            Post.objects.filter(pk__in=post_ids)
+            .values_list("pk", "comments_count")
+            .order_by()
+        )
+        to_update = [
+            Post(pk=pk, comments_count=comments.get(pk, 0))
+            for pk, count in stored
+            if count != comments.get(pk, 0)
+        ]
+        if not dry_run:
+            Post.objects.bulk_update(to_update, ["comments_count"])
+        return len(to_update)
+
+    def repair_images(self, dry_run):
+        actual = dict(
+            Post.objects.exclude(image="")
+            .values_list("image")
+            .annotate(Count("pk"))
+            .order_by()
+        )
+        stored = dict(StoredImage.objects.values_list("name", "refs"))
+        to_create = [
+            StoredImage(name=name, refs=refs)
+            for name, refs in actual.items()
+            if name not in stored
+        ]
+        to_update = [
+            StoredImage(name=name, refs=actual[name])
+            for name, refs in stored.items()
+            if name in actual and refs != actual[name]
+        ]
+        orphans = [name for name in stored if name not in actual]
+        if not dry_run:
+            with transaction.atomic():
+                StoredImage.objects.bulk_create(to_create)
+                StoredImage.objects.bulk_update(to_update, ["refs"])
+                StoredImage.objects.filter(name__in=orphans).delete()
+                for name in orphans:
+                    transaction.on_commit(
+                        lambda name=name: images.remove_files(name)
+                    )
+        return len(to_create) + len(to_update) + len(orphans)
@@ -0,0 +1,156 @@
+import random
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.cache import bump_versions
+from posts.cache import ALL_FEEDS
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Заполняет базу синтетическими пользователями, группами, постами, "
+        "подписками и комментариями для нагрузочных замеров."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--groups", type=int, default=20)
+        parser.add_argument("--posts", type=int, default=10000)
+        parser.add_argument(
+            "--follows",
+            type=int,
+            default=20,
+            help="Подписок на пользователя; популярность авторов неравная.",
+        )
+        parser.add_argument("--comments", type=int, default=10000)
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        prefix = f"seed{options['seed']}"
+        user_ids = self.create_users(prefix, options["users"])
+        group_ids = self.create_groups(prefix, options["groups"])
+        # Популярность авторов по закону Парето: немного «звёзд»
+        # с тысячами подписчиков и длинный хвост.
+        weights = [self.random.paretovariate(1.2) for _ in user_ids]
+        post_ids = self.create_posts(
+            user_ids, group_ids, weights, options["posts"]
+        )
+        self.create_follows(user_ids, weights, options["follows"])
+        self.create_comments(user_ids, post_ids, options["comments"])
+        call_command("recount_stats", stdout=self.stdout)
+        if settings.FOLLOW_TIMELINE:
+            call_command("rebuild_timelines", stdout=self.stdout)
+        bump_versions(ALL_FEEDS)
+        self.stdout.write(self.style.SUCCESS("Данные созданы"))
+
+    def bulk(self, model, objects, **kwargs):
+        created = 0
+        batch = []
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) == self.batch_size:
+                model.objects.bulk_create(batch, **kwargs)
+                created += len(batch)
+                batch = []
+        if batch:
+            model.objects.bulk_create(batch, **kwargs)
+            created += len(batch)
+        self.stdout.write(f"{model._meta.verbose_name_plural}: {created}")
+
+    def create_users(self, prefix, count):
+        password = make_password(None)
+        with transaction.atomic():
+            self.bulk(
+                User,
+                (
+                    User(username=f"{prefix}_user{i}", password=password)
+                    for i in range(count)
+                ),
+            )
+        return list(
+            User.objects.filter(username__startswith=f"{prefix}_user")
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+
+    def create_groups(self, prefix, count):
+        with transaction.atomic():
+            self.bulk(
+                Group,
+                (
+                    Group(
+                        title=f"Группа {i}",
+                        slug=f"{prefix}-group-{i}",
+                        description="Синтетическая группа",
+                    )
+                    for i in range(count)
+                ),
+            )
+        return list(
+            Group.objects.filter(slug__startswith=f"{prefix}-group-")
+            .values_list("pk", flat=True)
+        )
+
+    def create_posts(self, user_ids, group_ids, weights, count):
+        authors = self.random.choices(user_ids, weights, k=count)
+        first_id = Post.objects.order_by("-pk").values_list("pk", flat=True)
+        first_id = (first_id.first() or 0) + 1
+        with transaction.atomic():
+            self.bulk(
+                Post,
+                (
+                    Post(
+                        text=f"Синтетический пост {i}",
+                        author_id=author_id,
+                        group_id=(
+                            self.random.choice(group_ids)
+                            if group_ids and self.random.random() < 0.5
+                            else None
+                        ),
+                    )
+                    for i, author_id in enumerate(authors)
+                ),
+            )
+        return list(
+            Post.objects.filter(pk__gte=first_id).values_list("pk", flat=True)
+        )
+
+    def create_follows(self, user_ids, weights, per_user):
+        def follows():
+            for user_id in user_ids:
+                authors = set(
+                    self.random.choices(user_ids, weights, k=per_user)
+                )
+                authors.discard(user_id)
+                for author_id in authors:
+                    yield Follow(user_id=user_id, author_id=author_id)
+
+        with transaction.atomic():
+            self.bulk(Follow, follows(), ignore_conflicts=True)
+
+    def create_comments(self, user_ids, post_ids, count):
+        if not post_ids:
+            return
+        with transaction.atomic():
+            self.bulk(
+                Comment,
+                (
+                    Comment(
+                        post_id=self.random.choice(post_ids),
+                        author_id=self.random.choice(user_ids),
+                        text=f"Синтетический комментарий {i}",
+                    )
+                    for i in range(count)
+                ),
+            )
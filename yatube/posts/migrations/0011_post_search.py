@@ -0,0 +1,90 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+import posts.models
+
+# SQL зафиксирован здесь, а не берётся из posts.search: миграция должна
+# делать то же, что и в момент написания. Триггеры после каждого migrate
+# восстанавливает posts.search.install_triggers.
+INSTALL_SQL = (
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS posts_post_fts
+    USING fts5(text, content='posts_post', content_rowid='id')
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS posts_post_fts_insert
+    AFTER INSERT ON posts_post BEGIN
+        INSERT INTO posts_post_fts(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS posts_post_fts_delete
+    AFTER DELETE ON posts_post BEGIN
+        INSERT INTO posts_post_fts(posts_post_fts, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS posts_post_fts_update
+    AFTER UPDATE OF text ON posts_post BEGIN
+        INSERT INTO posts_post_fts(posts_post_fts, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO posts_post_fts(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+    "INSERT INTO posts_post_fts(posts_post_fts) VALUES ('rebuild')",
+)
+UNINSTALL_SQL = (
+    "DROP TRIGGER IF EXISTS posts_post_fts_insert",
+    "DROP TRIGGER IF EXISTS posts_post_fts_delete",
+    "DROP TRIGGER IF EXISTS posts_post_fts_update",
+    "DROP TABLE IF EXISTS posts_post_fts",
+)
+
+
+def install(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        for statement in INSTALL_SQL:
+            schema_editor.execute(statement)
+
+
+def uninstall(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        for statement in UNINSTALL_SQL:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0010_feed_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PostSearch",
+            fields=[
+                (
+                    "post",
+                    models.OneToOneField(
+                        db_column="rowid",
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        primary_key=True,
+                        related_name="search_entry",
+                        serialize=False,
+                        to="posts.Post",
+                    ),
+                ),
+                ("text", posts.models.SearchField()),
+                ("rank", models.FloatField()),
+            ],
+            options={
+                "db_table": "posts_post_fts",
+                "managed": False,
+            },
+        ),
+        migrations.RunPython(install, uninstall),
+    ]
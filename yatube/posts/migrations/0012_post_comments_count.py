@@ -0,0 +1,38 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:58
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+
+
+
+def fill_comments_count(apps, schema_editor):
+    Comment = apps.get_model("posts", "Comment")
+    Post = apps.get_model("posts", "Post")
+    counts = (
+        Comment.objects.filter(post=OuterRef("pk"))
+        .order_by()
+        .values("post")
+        .annotate(count=Count("pk"))
+        .values("count")
+    )
+    Post.objects.filter(pk__in=Comment.objects.values("post")).update(
+        comments_count=Subquery(counts)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0011_post_search"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="comments_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Комментариев"
+            ),
+        ),
+        migrations.RunPython(fill_comments_count, migrations.RunPython.noop),
+    ]
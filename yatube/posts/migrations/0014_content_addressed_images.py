@@ -0,0 +1,53 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:58
+
+from django.db import migrations, models
+from django.db.models import Count
+
+import posts.storage
+
+
+def fill_stored_images(apps, schema_editor):
+    Post = apps.get_model("posts", "Post")
+    StoredImage = apps.get_model("posts", "StoredImage")
+    refs = (
+        Post.objects.exclude(image="")
+        .values_list("image")
+        .annotate(Count("pk"))
+        .order_by()
+    )
+    StoredImage.objects.bulk_create(
+        StoredImage(name=name, refs=count) for name, count in refs
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0013_image_variant"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StoredImage",
+            fields=[
+                (
+                    "name",
+                    models.CharField(
+                        max_length=255, primary_key=True, serialize=False
+                    ),
+                ),
+                ("refs", models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name="post",
+            name="image",
+            field=models.ImageField(
+                blank=True,
+                storage=posts.storage.ContentAddressedStorage(),
+                upload_to="posts/",
+                verbose_name="Картинка",
+            ),
+        ),
+        migrations.RunPython(fill_stored_images, migrations.RunPython.noop),
+    ]
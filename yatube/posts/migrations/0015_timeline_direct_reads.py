@@ -0,0 +1,39 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_direct_reads(apps, schema_editor):
+    # Посты популярных авторов до сих пор не раскладывались по лентам.
+    UserStats = apps.get_model("posts", "UserStats")
+    UserStats.objects.filter(
+        followers_count__gt=settings.TIMELINE_FANOUT_LIMIT
+    ).update(direct_reads=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0014_content_addressed_images"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="timelineentry",
+            name="timeline_user_date",
+        ),
+        migrations.AddIndex(
+            model_name="timelineentry",
+            index=models.Index(
+                fields=["user", "-pub_date", "-post"],
+                name="timeline_user_date_post",
+            ),
+        ),
+        migrations.AddField(
+            model_name="userstats",
+            name="direct_reads",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(mark_direct_reads, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,8 @@
 from django.contrib.auth import get_user_model
 from django.db import models
 
+from .storage import ContentAddressedStorage
+
 User = get_user_model()
 
 
@@ -25,6 +27,34 @@ class Group(models.Model):
         return self.title
 
 
+class SearchField(models.TextField):
+    """Колонка полнотекстового индекса с поиском через lookup match."""
+
+
+@SearchField.register_lookup
+class Match(models.Lookup):
+    lookup_name = "match"
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} MATCH {rhs}", lhs_params + rhs_params
+
+
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Посты для карточек ленты: автор и группа одним запросом."""
+        return self.select_related("author", "group").only(
+            "text",
+            "pub_date",
+            "image",
+            "comments_count",
+            "author__username",
+            "group__slug",
+            "group__title",
+        )
+
+
 class Post(models.Model):
 
     text = models.TextField(
@@ -49,14 +79,48 @@ class Post(models.Model):
         verbose_name="Группа",
         help_text="Выбери группу",
     )
-    image = models.ImageField("Картинка", upload_to="posts/", blank=True)
+    image = models.ImageField(
+        "Картинка",
+        upload_to="posts/",
+        storage=ContentAddressedStorage(),
+        blank=True,
+    )
+    # Поддерживается сигналами комментариев, чинится recount_stats.
+    comments_count = models.PositiveIntegerField(
+        "Комментариев", default=0, editable=False
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ["-pub_date"]
+        indexes = [
+            models.Index(fields=["pub_date", "id"], name="post_date_id"),
+            models.Index(
+                fields=["author", "pub_date"], name="post_author_date"
+            ),
+            models.Index(fields=["group", "pub_date"], name="post_group_date"),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
+    def save(self, *args, **kwargs):
+        # Счётчик комментариев меняется только через F(): полное
+        # сохранение записало бы прочитанное ранее значение поверх
+        # чужих прибавлений.
+        if (
+            not self._state.adding
+            and kwargs.get("update_fields") is None
+            and not kwargs.get("force_insert")
+        ):
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != "comments_count"
+            ]
+        super().save(*args, **kwargs)
+
 
 class Comment(models.Model):
 
@@ -71,6 +135,13 @@ class Comment(models.Model):
     created = models.DateTimeField("date published", auto_now_add=True)
     text = models.TextField()
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["post", "created"], name="comment_post_created"
+            )
+        ]
+
     def __str__(self):
         return self.text
 
@@ -90,3 +161,98 @@ class Follow(models.Model):
                 fields=["user", "author"], name="follower"
             )
         ]
+        indexes = [
+            models.Index(fields=["author", "user"], name="follow_author_user")
+        ]
+
+
+class TimelineEntry(models.Model):
+    """Пост в материализованной ленте подписок пользователя."""
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="timeline"
+    )
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, related_name="timeline_entries"
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "post"], name="timeline_entry"
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=["user", "-pub_date", "-post"],
+                name="timeline_user_date_post",
+            )
+        ]
+
+
+class UserStats(models.Model):
+    """Счётчики профиля, которые поддерживаются при записи."""
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="stats",
+    )
+    posts_count = models.PositiveIntegerField(default=0)
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+    # Посты автора не раскладываются по лентам подписчиков (posts.timeline).
+    direct_reads = models.BooleanField(default=False)
+
+
+class ImageVariant(models.Model):
+    """Готовая копия картинки поста в одной ширине и формате.
+
+    Записи создаёт posts.thumbnails после генерации файла, и шаблоны
+    строят srcset только по ним, не обращаясь к хранилищу.
+    """
+
+    source = models.CharField(max_length=255)
+    format = models.CharField(max_length=10)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    name = models.CharField(max_length=255)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["source", "format", "width"], name="image_variant"
+            )
+        ]
+
+
+class StoredImage(models.Model):
+    """Файл картинки и число постов, которые на него ссылаются."""
+
+    name = models.CharField(max_length=255, primary_key=True)
+    refs = models.PositiveIntegerField(default=0)
+
+
+class PostSearch(models.Model):
+    """Строка полнотекстового индекса постов (FTS5, см. posts.search).
+
+    Таблицу создаёт и наполняет миграция, поэтому модель не управляется
+    Django. rank — скрытая колонка FTS5 со значением bm25.
+    """
+
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        db_column="rowid",
+        db_constraint=False,
+        related_name="search_entry",
+    )
+    text = SearchField()
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = "posts_post_fts"
@@ -0,0 +1,167 @@
+import base64
+import binascii
+from collections.abc import Sequence
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+NEXT = "n"
+PREVIOUS = "p"
+# Наибольший id, который помещается в INTEGER базы (64 бита со знаком).
+MAX_ID = 2 ** 63 - 1
+
+
+def encode_cursor(direction, value, pk):
+    # repr сохраняет float без потери точности: курсор по рангу
+    # должен в точности совпасть со значением в базе.
+    value = value.isoformat() if hasattr(value, "isoformat") else repr(value)
+    raw = f"{direction}|{value}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token, parse=parse_datetime):
+    """Возвращает (направление, значение ключа, id) или None для битого."""
+    if not token:
+        return None
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        direction, value, pk = raw.split("|")
+        value = parse(value)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if direction not in (NEXT, PREVIOUS) or value is None:
+        return None
+    if not 0 < pk <= MAX_ID:
+        return None
+    return direction, value, pk
+
+
+def seek(queryset, key, position, descending, pk="pk"):
+    """queryset после позиции (значение ключа, id) в порядке (key, pk)."""
+    if position is not None:
+        value, last = position
+        lookup = "lt" if descending else "gt"
+        queryset = queryset.filter(
+            Q(**{f"{key}__{lookup}": value})
+            | Q(**{key: value, f"{pk}__{lookup}": last})
+        )
+    sign = "-" if descending else ""
+    return queryset.order_by(f"{sign}{key}", f"{sign}{pk}")
+
+
+class CursorPage(Sequence):
+    """Страница курсорной пагинации.
+
+    Запрос к базе выполняется при первом обращении к постам или ссылкам,
+    поэтому страница из кеша фрагмента базу не трогает.
+    """
+
+    cursor_based = True
+
+    def __init__(self, paginator, cursor):
+        self.paginator = paginator
+        self.cursor = decode_cursor(cursor, paginator.parse)
+
+    def __repr__(self):
+        return f"<CursorPage {self.next_cursor or '-'}>"
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    @cached_property
+    def _page(self):
+        paginator = self.paginator
+        per_page = paginator.per_page
+        key = paginator.key
+        if self.cursor is None:
+            direction, position = NEXT, None
+        else:
+            direction, *position = self.cursor
+        descending = paginator.descending == (direction == NEXT)
+        rows = paginator.fetch(position, descending, per_page + 1)
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+        if direction == PREVIOUS:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, self.cursor is not None
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            last = rows[-1]
+            next_cursor = encode_cursor(NEXT, getattr(last, key), last.pk)
+        if rows and has_previous:
+            first = rows[0]
+            previous_cursor = encode_cursor(
+                PREVIOUS, getattr(first, key), first.pk
+            )
+        return rows, next_cursor, previous_cursor
+
+    @property
+    def object_list(self):
+        return self._page[0]
+
+    @property
+    def next_cursor(self):
+        return self._page[1]
+
+    @property
+    def previous_cursor(self):
+        return self._page[2]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Пагинация по ключу (pub_date, id) без COUNT и OFFSET.
+
+    Стоимость любой страницы одинакова: выборка идёт по индексу
+    от позиции, зашитой в курсор. Подклассы меняют ключ сортировки.
+    """
+
+    key = "pub_date"
+    descending = True
+    parse = staticmethod(parse_datetime)
+
+    def __init__(self, object_list, per_page):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+
+    def get_page(self, cursor):
+        return CursorPage(self, cursor)
+
+    def fetch(self, position, descending, limit):
+        """Первые limit объектов после позиции курсора."""
+        queryset = seek(self.object_list, self.key, position, descending)
+        return list(queryset[:limit])
+
+
+class CommentPaginator(CursorPaginator):
+    """Комментарии поста от старых к новым по индексу (post, created)."""
+
+    key = "created"
+    descending = False
+
+
+def get_page_obj(request, queryset):
+    """Страница ленты: курсорная или обычная, по CURSOR_PAGINATION."""
+    if settings.CURSOR_PAGINATION:
+        paginator = CursorPaginator(queryset, settings.PAR_PAGE)
+        return paginator.get_page(request.GET.get("cursor"))
+    paginator = Paginator(queryset, settings.PAR_PAGE)
+    return paginator.get_page(request.GET.get("page"))
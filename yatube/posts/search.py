@@ -0,0 +1,88 @@
+"""Полнотекстовый поиск по постам.
+
+В SQLite текст постов индексирует виртуальная таблица FTS5
+posts_post_fts с внешним содержимым: триггеры на posts_post обновляют её
+при любой записи, включая bulk_create, import_data и правки в админке.
+На других базах поиск сводится к icontains без ранжирования.
+"""
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.models import F, FloatField, Value
+
+from .paginator import CursorPaginator
+
+# Триггеры ставятся после каждого migrate (install_triggers): SQLite
+# удаляет их вместе с posts_post, когда миграция пересоздаёт таблицу.
+# Саму таблицу FTS5 создаёт миграция 0011.
+TRIGGERS_SQL = (
+    """
+    CREATE TRIGGER IF NOT EXISTS posts_post_fts_insert
+    AFTER INSERT ON posts_post BEGIN
+        INSERT INTO posts_post_fts(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS posts_post_fts_delete
+    AFTER DELETE ON posts_post BEGIN
+        INSERT INTO posts_post_fts(posts_post_fts, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS posts_post_fts_update
+    AFTER UPDATE OF text ON posts_post BEGIN
+        INSERT INTO posts_post_fts(posts_post_fts, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO posts_post_fts(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+)
+
+
+def install_triggers(using=DEFAULT_DB_ALIAS, **kwargs):
+    """Ставит недостающие триггеры индекса (обработчик post_migrate)."""
+    database = connections[using]
+    if database.vendor != "sqlite":
+        return
+    tables = database.introspection.table_names()
+    if "posts_post" not in tables or "posts_post_fts" not in tables:
+        return
+    with database.cursor() as cursor:
+        for statement in TRIGGERS_SQL:
+            cursor.execute(statement)
+
+
+def available():
+    return connection.vendor == "sqlite"
+
+
+def match_expression(query):
+    """Запрос пользователя -> выражение MATCH: все слова по префиксу.
+
+    Слова берутся в кавычки, поэтому операторы FTS5 и спецсимволы
+    из запроса не ломают синтаксис.
+    """
+    return " ".join(f'"{word}"*' for word in re.findall(r"\w+", query))
+
+
+def search_posts(queryset, query):
+    """Посты, подходящие под запрос, с рангом rank (меньше — лучше)."""
+    expression = match_expression(query)
+    if expression and available():
+        return queryset.filter(search_entry__text__match=expression).annotate(
+            rank=F("search_entry__rank")
+        )
+    if expression:
+        queryset = queryset.filter(text__icontains=query)
+    else:
+        queryset = queryset.none()
+    return queryset.annotate(rank=Value(0.0, output_field=FloatField()))
+
+
+class RankPaginator(CursorPaginator):
+    """Курсорная пагинация результатов поиска по (rank, id)."""
+
+    key = "rank"
+    descending = False
+    parse = float
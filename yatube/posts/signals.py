@@ -0,0 +1,128 @@
+from django.conf import settings
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core.cache import bump_versions
+
+from . import images, stats, timeline
+from .cache import ALL_FEEDS, group_feed, post_scopes, profile_feed
+from .models import Comment, Follow, Group, Post
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous_post(sender, instance, **kwargs):
+    instance._previous_group_id = None
+    instance._previous_image = ""
+    if instance.pk:
+        previous = (
+            Post.objects.filter(pk=instance.pk)
+            .values_list("group_id", "image")
+            .first()
+        )
+        if previous is not None:
+            instance._previous_group_id, instance._previous_image = previous
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_scopes(sender, instance, **kwargs):
+    scopes = post_scopes(instance)
+    previous_group_id = getattr(instance, "_previous_group_id", None)
+    if previous_group_id:
+        scopes.append(group_feed(previous_group_id))
+    bump_versions(*scopes)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_scopes(sender, instance, **kwargs):
+    post = Post.objects.filter(pk=instance.post_id).first()
+    if post is not None:
+        bump_versions(*post_scopes(post))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_feeds(sender, instance, **kwargs):
+    # Название группы выводится в карточках всех лент.
+    bump_versions(ALL_FEEDS)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_profiles(sender, instance, **kwargs):
+    # На странице профиля выводятся число подписчиков и подписок.
+    bump_versions(
+        profile_feed(instance.user_id), profile_feed(instance.author_id)
+    )
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    if created and settings.FOLLOW_TIMELINE:
+        timeline.enqueue(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    if created and settings.FOLLOW_TIMELINE:
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def clean_timeline(sender, instance, **kwargs):
+    if settings.FOLLOW_TIMELINE:
+        timeline.remove(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+def count_new_post(sender, instance, created, **kwargs):
+    if created:
+        stats.change(instance.author_id, "posts_count", 1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    stats.change(instance.author_id, "posts_count", -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_new_follow(sender, instance, created, **kwargs):
+    if created:
+        stats.change(instance.author_id, "followers_count", 1)
+        stats.change(instance.user_id, "following_count", 1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    stats.change(instance.author_id, "followers_count", -1)
+    stats.change(instance.user_id, "following_count", -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, **kwargs):
+    if created:
+        Post.objects.filter(pk=instance.post_id).update(
+            comments_count=F("comments_count") + 1
+        )
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    Post.objects.filter(pk=instance.post_id, comments_count__gt=0).update(
+        comments_count=F("comments_count") - 1
+    )
+
+
+@receiver(post_save, sender=Post)
+def count_image_refs(sender, instance, **kwargs):
+    previous = getattr(instance, "_previous_image", "")
+    if instance.image.name != previous:
+        images.retain(instance.image.name)
+        images.release(previous)
+
+
+@receiver(post_delete, sender=Post)
+def release_deleted_image(sender, instance, **kwargs):
+    images.release(instance.image.name)
@@ -0,0 +1,163 @@
+"""Статические карты сайта для постов, групп и профилей.
+
+Каждый раздел делится на файлы по SITEMAP_CHUNK_SIZE адресов в порядке
+(дата, id), так что новые посты попадают в последний файл. manifest.json
+хранит отпечаток каждого файла, и при повторном запуске переписываются
+только файлы, чьи адреса или даты изменились. Файлы отдаёт веб-сервер
+из SITEMAP_ROOT, поэтому обход сайта роботами не идёт по глубоким
+страницам лент.
+"""
+import hashlib
+import json
+import os
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Max
+from django.urls import reverse
+
+from .models import Group, Post
+
+User = get_user_model()
+
+MANIFEST = "manifest.json"
+INDEX = "sitemap.xml"
+XMLNS = "http://www.sitemaps.org/schemas/sitemap/0.9"
+
+
+def post_entries():
+    posts = Post.objects.order_by("pub_date", "pk").values_list(
+        "pk", "pub_date"
+    )
+    for pk, pub_date in posts.iterator():
+        yield reverse("posts:post_detail", args=(pk,)), pub_date
+
+
+def group_entries():
+    groups = (
+        Group.objects.annotate(lastmod=Max("posts__pub_date"))
+        .order_by("pk")
+        .values_list("slug", "lastmod")
+    )
+    for slug, lastmod in groups.iterator():
+        yield reverse("posts:group_posts", args=(slug,)), lastmod
+
+
+def profile_entries():
+    authors = (
+        User.objects.filter(posts__isnull=False)
+        .annotate(lastmod=Max("posts__pub_date"))
+        .order_by("pk")
+        .values_list("username", "lastmod")
+    )
+    for username, lastmod in authors.iterator():
+        yield reverse("posts:profile", args=(username,)), lastmod
+
+
+SECTIONS = {
+    "posts": post_entries,
+    "groups": group_entries,
+    "profiles": profile_entries,
+}
+
+
+def chunks(entries, size):
+    chunk = []
+    for entry in entries:
+        chunk.append(entry)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def fingerprint(chunk):
+    digest = hashlib.md5()
+    for location, lastmod in chunk:
+        digest.update(f"{location}|{lastmod}\n".encode())
+    return digest.hexdigest()
+
+
+def write_atomic(path, lines):
+    temporary = f"{path}.tmp"
+    with open(temporary, "w", encoding="utf-8") as file:
+        file.writelines(lines)
+    os.replace(temporary, path)
+
+
+def urlset(base_url, chunk):
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield f'<urlset xmlns="{XMLNS}">\n'
+    for location, lastmod in chunk:
+        yield f"<url><loc>{escape(base_url + location)}</loc>"
+        if lastmod is not None:
+            yield f"<lastmod>{lastmod.date().isoformat()}</lastmod>"
+        yield "</url>\n"
+    yield "</urlset>\n"
+
+
+def sitemap_index(base_url, files):
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield f'<sitemapindex xmlns="{XMLNS}">\n'
+    for name, lastmod in files:
+        location = escape(f"{base_url}{settings.SITEMAP_URL}{name}")
+        yield f"<sitemap><loc>{location}</loc>"
+        if lastmod:
+            yield f"<lastmod>{lastmod}</lastmod>"
+        yield "</sitemap>\n"
+    yield "</sitemapindex>\n"
+
+
+def load_manifest(root):
+    try:
+        with open(os.path.join(root, MANIFEST), encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def generate(base_url, root=None, chunk_size=None, force=False):
+    """Обновляет карты сайта и возвращает число переписанных файлов."""
+    root = root or settings.SITEMAP_ROOT
+    chunk_size = chunk_size or settings.SITEMAP_CHUNK_SIZE
+    base_url = base_url.rstrip("/")
+    os.makedirs(root, exist_ok=True)
+    stored = load_manifest(root)
+    previous = {}
+    if not force and stored.get("base_url") == base_url:
+        previous = stored.get("files", {})
+    files = {}
+    written = 0
+    for section, entries in SECTIONS.items():
+        for number, chunk in enumerate(chunks(entries(), chunk_size), 1):
+            name = f"{section}-{number}.xml"
+            dates = [lastmod for _, lastmod in chunk if lastmod is not None]
+            files[name] = {
+                "digest": fingerprint(chunk),
+                "count": len(chunk),
+                "lastmod": max(dates).date().isoformat() if dates else None,
+            }
+            path = os.path.join(root, name)
+            if previous.get(name) != files[name] or not os.path.exists(path):
+                write_atomic(path, urlset(base_url, chunk))
+                written += 1
+    for name in set(stored.get("files", {})) - set(files):
+        path = os.path.join(root, name)
+        if os.path.exists(path):
+            os.remove(path)
+    index = os.path.join(root, INDEX)
+    if files != previous or not os.path.exists(index):
+        write_atomic(
+            index,
+            sitemap_index(
+                base_url,
+                [(name, state["lastmod"]) for name, state in files.items()],
+            ),
+        )
+        manifest = {"base_url": base_url, "files": files}
+        write_atomic(
+            os.path.join(root, MANIFEST), [json.dumps(manifest, indent=1)]
+        )
+    return written
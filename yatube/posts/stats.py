@@ -0,0 +1,46 @@
+"""Денормализованные счётчики профиля.
+
+Счётчики меняются в сигналах создания и удаления Post и Follow. Строка
+UserStats заводится при первом обращении пересчётом по исходным
+таблицам, а расхождения чинит команда recount_stats.
+"""
+from django.db.models import F
+
+from .models import Follow, Post, UserStats
+
+
+def recount(user_id):
+    """Пересчитывает счётчики пользователя по исходным таблицам."""
+    stats, _ = UserStats.objects.update_or_create(
+        user_id=user_id,
+        defaults={
+            "posts_count": Post.objects.filter(author_id=user_id).count(),
+            "followers_count": Follow.objects.filter(
+                author_id=user_id
+            ).count(),
+            "following_count": Follow.objects.filter(
+                user_id=user_id
+            ).count(),
+        },
+    )
+    return stats
+
+
+def change(user_id, field, delta):
+    stats = UserStats.objects.filter(user_id=user_id)
+    if delta < 0:
+        # Счётчик, разошедшийся до нуля, не уходит в минус: иначе
+        # PositiveIntegerField уронил бы запрос IntegrityError.
+        stats = stats.filter(**{f"{field}__gte": -delta})
+    updated = stats.update(**{field: F(field) + delta})
+    if not updated and delta > 0:
+        # Пересчёт уже учитывает только что созданную запись.
+        recount(user_id)
+
+
+def get_stats(user):
+    """Счётчики пользователя; строка создаётся при первом обращении."""
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        return recount(user.pk)
@@ -0,0 +1,58 @@
+"""Хранилище картинок постов по содержимому.
+
+Файл сохраняется под именем <каталог>/<aa>/<bb>/<sha256>.<расширение>,
+поэтому одинаковые картинки разных постов лежат одним файлом, а
+миниатюры и варианты, которые строятся по имени, тоже общие. Сколько
+постов ссылается на файл, считает posts.images.
+"""
+import hashlib
+import os
+import posixpath
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        # Итоговое имя задаёт содержимое, см. _save.
+        return name
+
+    def _save(self, name, content):
+        """Пишет во временный файл, попутно считая хеш, и переименовывает.
+
+        Содержимое читается один раз. Если файл с таким хешем уже есть,
+        временный удаляется, а возвращается имя существующего.
+        """
+        directory, original = posixpath.split(name)
+        extension = os.path.splitext(original)[1].lower()
+        os.makedirs(self.path(directory), exist_ok=True)
+        temporary = self.path(
+            posixpath.join(directory, f".{uuid.uuid4().hex}.part")
+        )
+        digest = hashlib.sha256()
+        try:
+            descriptor = os.open(
+                temporary, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666
+            )
+            with os.fdopen(descriptor, "wb") as file:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    file.write(chunk)
+            hexdigest = digest.hexdigest()
+            hashed = posixpath.join(
+                directory, hexdigest[:2], hexdigest[2:4], hexdigest + extension
+            )
+            path = self.path(hashed)
+            if os.path.exists(path):
+                os.remove(temporary)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(temporary, path)
+                if self.file_permissions_mode is not None:
+                    os.chmod(path, self.file_permissions_mode)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        return hashed
@@ -0,0 +1,19 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def image_variants(context, image):
+    """Готовые варианты картинки или None, пока они создаются.
+
+    В ленте варианты загружаются сразу для всей страницы page_obj.
+    """
+    if not image:
+        return None
+    page = context.get("page_obj")
+    if page is not None:
+        return thumbnails.page_variants(page).get(image.name)
+    return thumbnails.get_variants(image)
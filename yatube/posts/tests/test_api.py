@@ -0,0 +1,105 @@
+import gzip
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+from posts.tests.utils import OnCommitMixin
+
+User = get_user_model()
+
+
+class ApiTest(OnCommitMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username="author")
+        cls.reader = User.objects.create_user(username="reader")
+        cls.group = Group.objects.create(
+            title="Группа", slug="api", description="Описание"
+        )
+        cls.posts = [
+            Post.objects.create(
+                text=f"Пост {i}", author=cls.author, group=cls.group
+            )
+            for i in range(3)
+        ]
+        Comment.objects.create(post=cls.posts[0], author=cls.reader, text="!")
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, name, *args, **params):
+        response = self.client.get(reverse(f"api:{name}", args=args), params)
+        self.assertEqual(response["Content-Type"], "application/json")
+        return response, json.loads(response.content)
+
+    def test_feeds(self):
+        """Ленты API отдают те же посты, что и HTML-страницы."""
+        self.client.force_login(self.reader)
+        expected = [post.pk for post in reversed(self.posts)]
+        for name, args in (
+            ("index", ()),
+            ("group_posts", (self.group.slug,)),
+            ("profile", (self.author.username,)),
+            ("follow_index", ()),
+        ):
+            with self.subTest(name=name):
+                response, data = self.get(name, *args)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    [post["id"] for post in data["results"]], expected
+                )
+                self.assertEqual(data["results"][0]["author"], "author")
+                self.assertEqual(
+                    data["groups"], {"api": {"title": "Группа"}}
+                )
+
+    def test_post_detail(self):
+        response, data = self.get("post_detail", self.posts[0].pk)
+        self.assertEqual(data["post"]["text"], "Пост 0")
+        self.assertEqual(data["post"]["comments_count"], 1)
+        self.assertEqual(data["comments"][0]["author"], "reader")
+        response, data = self.get("post_detail", 0)
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(PAR_PAGE=2)
+    def test_cursor_and_fields(self):
+        """?fields= оставляет только выбранные поля, курсор листает."""
+        _, first = self.get("index", fields="id,text")
+        self.assertEqual(set(first["results"][0]), {"id", "text"})
+        self.assertEqual(first["groups"], {})
+        _, second = self.get("index", fields="id", cursor=first["next"])
+        self.assertEqual(
+            [post["id"] for post in second["results"]], [self.posts[0].pk]
+        )
+        self.assertIsNone(second["next"])
+        response, data = self.get("index", fields="id,password")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("password", data["detail"])
+
+    def test_follow_requires_login(self):
+        response, _ = self.get("follow_index")
+        self.assertEqual(response.status_code, 401)
+
+    def test_gzip_and_cache(self):
+        """Ответ сжимается и кешируется до записи в ленту."""
+        Post.objects.bulk_create(
+            [Post(text="x" * 200, author=self.author) for _ in range(5)]
+        )
+        cache.clear()
+        url = reverse("api:index")
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        data = json.loads(gzip.decompress(response.content))
+        # Валидаторы и JSON берутся из кеша, база не нужна.
+        with self.assertNumQueries(0):
+            self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(text="Новый", author=self.author)
+        fresh = json.loads(self.client.get(url).content)
+        self.assertNotEqual(fresh["results"], data["results"])
+        self.assertEqual(fresh["results"][0]["text"], "Новый")
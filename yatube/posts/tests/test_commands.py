@@ -0,0 +1,312 @@
+import datetime as dt
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import Comment, Follow, Group, Post, UserStats
+from posts.transfer import append_id_map, lookup_id_map
+from posts.urls import urlpatterns
+
+User = get_user_model()
+
+
+class SeedAndBenchmarkTest(TestCase):
+    def test_seed_data(self):
+        """seed_data создаёт данные и пересчитывает счётчики."""
+        call_command(
+            "seed_data",
+            users=10,
+            groups=2,
+            posts=30,
+            follows=3,
+            comments=15,
+            stdout=StringIO(),
+        )
+        self.assertEqual(Post.objects.count(), 30)
+        self.assertEqual(Comment.objects.count(), 15)
+        self.assertTrue(Follow.objects.exists())
+        self.assertEqual(UserStats.objects.count(), 10)
+
+    def test_benchmark_reports_every_url(self):
+        """benchmark проходит все URL posts.urls и пишет JSON."""
+        call_command(
+            "seed_data", users=5, posts=10, comments=5, stdout=StringIO()
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "bench.json")
+            call_command(
+                "benchmark", requests=2, output=output, stdout=StringIO()
+            )
+            with open(output, encoding="utf-8") as file:
+                report = json.load(file)
+        names = {pattern.name for pattern in urlpatterns}
+        self.assertEqual(set(report["results"]), names)
+        for name, result in report["results"].items():
+            with self.subTest(name=name):
+                self.assertLess(max(result["status"]), 400)
+
+    def test_benchmark_without_follows(self):
+        """benchmark работает и на данных без подписок."""
+        call_command(
+            "seed_data", users=3, posts=5, follows=0, stdout=StringIO()
+        )
+        self.assertFalse(Follow.objects.exists())
+        stdout = StringIO()
+        call_command("benchmark", requests=1, stdout=stdout)
+        self.assertIn("Подписок нет", stdout.getvalue())
+
+
+class ConcurrencyBenchmarkTest(TransactionTestCase):
+    def test_benchmark_concurrency_compares_journal_modes(self):
+        """benchmark_concurrency меряет оба режима журнала на копиях."""
+        call_command("seed_data", users=5, posts=10, stdout=StringIO())
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "concurrency.json")
+            call_command(
+                "benchmark_concurrency",
+                readers=2,
+                duration=0.3,
+                write_hold=5,
+                output=output,
+                stdout=StringIO(),
+            )
+            with open(output, encoding="utf-8") as file:
+                report = json.load(file)
+        self.assertEqual(list(report), ["delete", "wal"])
+        for mode, result in report.items():
+            with self.subTest(mode=mode):
+                self.assertGreater(result["reads"], 0)
+                self.assertGreater(result["writes"], 0)
+                self.assertEqual(result["read_errors"], 0)
+        self.assertFalse(
+            Comment.objects.filter(text="Замер записи").exists()
+        )
+
+
+class ImportExportTest(TestCase):
+    MODELS = ("group", "post", "comment", "follow")
+
+    def setUp(self):
+        self.published = timezone.now() - dt.timedelta(days=30)
+        author = User.objects.create_user(username="author")
+        reader = User.objects.create_user(username="reader")
+        group = Group.objects.create(
+            title="Группа", slug="export", description="Описание"
+        )
+        for i in range(3):
+            post = Post.objects.create(
+                text=f"Пост {i}", author=author, group=group if i else None
+            )
+            Comment.objects.create(post=post, author=reader, text="!")
+        Post.objects.update(pub_date=self.published)
+        Follow.objects.create(user=reader, author=author)
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.id_map = os.path.join(self.directory.name, "post.ids")
+
+    def export_all(self, extension):
+        paths = {}
+        for model in self.MODELS:
+            paths[model] = os.path.join(
+                self.directory.name, f"{model}.{extension}"
+            )
+            call_command(
+                "export_data", model, paths[model], stderr=StringIO()
+            )
+        Group.objects.all().delete()
+        User.objects.all().delete()
+        return paths
+
+    def test_round_trip(self):
+        """Выгрузка и загрузка сохраняют записи, даты и счётчики."""
+        for extension in ("jsonl", "csv"):
+            with self.subTest(extension=extension):
+                paths = self.export_all(extension)
+                for model in self.MODELS:
+                    call_command(
+                        "import_data",
+                        model,
+                        paths[model],
+                        id_map=self.id_map,
+                        stdout=StringIO(),
+                    )
+                self.assertEqual(Post.objects.count(), 3)
+                self.assertEqual(Post.objects.filter(group=None).count(), 1)
+                self.assertEqual(Comment.objects.count(), 3)
+                self.assertTrue(
+                    Follow.objects.filter(
+                        user__username="reader", author__username="author"
+                    ).exists()
+                )
+                self.assertFalse(
+                    Post.objects.exclude(pub_date=self.published).exists()
+                )
+                stats = UserStats.objects.get(user__username="author")
+                self.assertEqual(stats.posts_count, 3)
+                self.assertEqual(stats.followers_count, 1)
+
+    def test_resume_from_checkpoint(self):
+        """Загрузка продолжается с записи из контрольной точки."""
+        paths = self.export_all("jsonl")
+        call_command("import_data", "group", paths["group"], stdout=StringIO())
+        checkpoint = os.path.join(self.directory.name, "post.checkpoint")
+        with open(checkpoint, "w", encoding="utf-8") as file:
+            file.write("2")
+        call_command(
+            "import_data",
+            "post",
+            paths["post"],
+            checkpoint=checkpoint,
+            id_map=self.id_map,
+            batch_size=1,
+            stdout=StringIO(),
+        )
+        self.assertEqual(
+            list(Post.objects.values_list("text", flat=True)), ["Пост 2"]
+        )
+        self.assertFalse(os.path.exists(checkpoint))
+
+    def test_import_into_filled_database(self):
+        """Занятые id постов меняются, комментарии идут к своим постам."""
+        paths = self.export_all("jsonl")
+        with open(paths["post"], encoding="utf-8") as file:
+            taken_id = json.loads(file.readline())["id"]
+        occupant = Post.objects.create(
+            pk=taken_id,
+            text="Местный пост",
+            author=User.objects.create_user(username="local"),
+        )
+        for model in ("group", "post", "comment"):
+            call_command(
+                "import_data",
+                model,
+                paths[model],
+                id_map=self.id_map,
+                stdout=StringIO(),
+            )
+        self.assertEqual(Post.objects.count(), 4)
+        self.assertFalse(occupant.comments.exists())
+        for post in Post.objects.exclude(pk=occupant.pk):
+            with self.subTest(post=post.text):
+                self.assertEqual(post.comments.count(), 1)
+        # Повтор пачки, записанной до сбоя, не дублирует комментарии.
+        checkpoint = os.path.join(self.directory.name, "comment.checkpoint")
+        with open(checkpoint, "w", encoding="utf-8") as file:
+            file.write("1")
+        call_command(
+            "import_data",
+            "comment",
+            paths["comment"],
+            checkpoint=checkpoint,
+            id_map=self.id_map,
+            batch_size=2,
+            stdout=StringIO(),
+        )
+        self.assertEqual(Comment.objects.count(), 3)
+
+    def test_id_map_looked_up_per_batch(self):
+        """Комментарии берут из соответствия только id своей пачки."""
+        append_id_map(self.id_map, [(1, 10), (2, 20), (3, 30)])
+        self.assertEqual(
+            lookup_id_map(self.id_map, {2, 3, 4}), {2: 20, 3: 30}
+        )
+        paths = self.export_all("jsonl")
+        for model in ("group", "post"):
+            call_command(
+                "import_data",
+                model,
+                paths[model],
+                id_map=self.id_map,
+                stdout=StringIO(),
+            )
+        with mock.patch(
+            "posts.management.commands.import_data.lookup_id_map",
+            wraps=lookup_id_map,
+        ) as lookup:
+            call_command(
+                "import_data",
+                "comment",
+                paths["comment"],
+                id_map=self.id_map,
+                batch_size=1,
+                stdout=StringIO(),
+            )
+        self.assertEqual(lookup.call_count, 3)
+        for call in lookup.call_args_list:
+            self.assertEqual(len(call[0][1]), 1)
+        self.assertEqual(Comment.objects.count(), 3)
+
+
+class SitemapTest(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+        overrides = override_settings(
+            SITEMAP_ROOT=self.root, SITEMAP_CHUNK_SIZE=2
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.author = User.objects.create_user(username="author")
+        self.group = Group.objects.create(
+            title="Группа", slug="sitemap", description="Описание"
+        )
+        self.posts = [
+            Post.objects.create(text=f"Пост {i}", author=self.author)
+            for i in range(3)
+        ]
+
+    def generate(self):
+        out = StringIO()
+        call_command(
+            "generate_sitemaps", base_url="https://example.com", stdout=out
+        )
+        return int(out.getvalue().split()[-1])
+
+    def read(self, name):
+        with open(os.path.join(self.root, name), encoding="utf-8") as file:
+            return file.read()
+
+    def test_chunks_and_index(self):
+        self.assertEqual(self.generate(), 4)
+        self.assertEqual(
+            sorted(os.listdir(self.root)),
+            [
+                "groups-1.xml",
+                "manifest.json",
+                "posts-1.xml",
+                "posts-2.xml",
+                "profiles-1.xml",
+                "sitemap.xml",
+            ],
+        )
+        index = self.read("sitemap.xml")
+        self.assertIn(
+            "<loc>https://example.com/sitemaps/posts-2.xml</loc>", index
+        )
+        post_url = reverse("posts:post_detail", args=(self.posts[2].pk,))
+        self.assertIn(
+            f"<loc>https://example.com{post_url}</loc>",
+            self.read("posts-2.xml"),
+        )
+
+    def test_only_changed_chunks_are_rewritten(self):
+        """Новый пост переписывает последний файл постов и профилей."""
+        self.generate()
+        self.assertEqual(self.generate(), 0)
+        Post.objects.create(text="Новый", author=self.author)
+        self.assertEqual(self.generate(), 2)
+        self.posts[0].delete()
+        Post.objects.filter(text="Новый").delete()
+        self.assertEqual(self.generate(), 2)
+        self.assertFalse(
+            os.path.exists(os.path.join(self.root, "posts-2.xml"))
+        )
@@ -1,18 +1,27 @@
+import hashlib
+import os
 import shutil
 import tempfile
 
+from io import BytesIO
+
 from django.conf import settings
-from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadedfile import (
+    SimpleUploadedFile,
+    TemporaryUploadedFile,
+)
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
+from posts import uploads
 from posts.models import Group, Post, Comment, User
 
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, IMAGE_UPLOAD_WORKERS=0)
 class PostFormTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -68,12 +77,13 @@ class PostFormTests(TestCase):
             reverse("posts:profile", kwargs={"username": self.user.username}),
         )
         self.assertEqual(Post.objects.count(), posts_count + 1)
+        digest = hashlib.sha256(small_gif).hexdigest()
         self.assertTrue(
             Post.objects.filter(
                 text=form_data["text"],
                 group=PostFormTests.group.id,
                 author=self.user,
-                image='posts/small.gif'
+                image=f"posts/{digest[:2]}/{digest[2:4]}/{digest}.gif",
             ).exists()
         )
 
@@ -95,6 +105,118 @@ class PostFormTests(TestCase):
         self.assertEqual(post.text, edit_post_data["text"])
 
 
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, IMAGE_UPLOAD_WORKERS=0)
+class ImageUploadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="uploader")
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    @staticmethod
+    def jpeg(name, size, orientation=None):
+        image = Image.new("RGB", size, (200, 10, 10))
+        exif = image.getexif()
+        exif[0x010F] = "Камера"
+        if orientation:
+            exif[0x0112] = orientation
+        output = BytesIO()
+        image.save(output, "JPEG", exif=exif)
+        return SimpleUploadedFile(
+            name, output.getvalue(), content_type="image/jpeg"
+        )
+
+    def create(self, image):
+        return self.client.post(
+            reverse("posts:post_create"), {"text": "Пост", "image": image}
+        )
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=100 * 100)
+    def test_too_many_pixels_rejected(self):
+        """Картинка с лишними пикселями отклоняется по заголовку."""
+        response = self.create(self.jpeg("big.jpg", (200, 100)))
+        self.assertFormError(
+            response, "form", "image", "Картинка больше 0.01 Мп."
+        )
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(POST_IMAGE_MAX_BYTES=100)
+    def test_too_large_file_rejected(self):
+        """Слишком большой файл отклоняется."""
+        response = self.create(self.jpeg("heavy.jpg", (50, 50)))
+        self.assertFormError(
+            response, "form", "image", "Файл больше 100\xa0байт."
+        )
+
+    @override_settings(POST_IMAGE_MAX_SIDE=100)
+    def test_oversize_image_downsized_without_exif(self):
+        """Большая картинка уменьшается, поворачивается и теряет EXIF."""
+        self.create(self.jpeg("photo.jpg", (300, 200), orientation=6))
+        post = Post.objects.get()
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (67, 100))
+            self.assertNotIn("exif", image.info)
+        self.assertEqual(uploads.status(post.pk)["state"], "done")
+
+    def test_exif_stripped_from_small_image(self):
+        """EXIF удаляется и у картинки, которую не нужно уменьшать."""
+        self.create(self.jpeg("small.jpg", (40, 30)))
+        with Image.open(Post.objects.get().image.path) as image:
+            self.assertEqual(image.size, (40, 30))
+            self.assertNotIn("exif", image.info)
+
+    def test_upload_moved_not_copied(self):
+        """Загрузка с диска переносится в очередь, а не копируется."""
+        upload = TemporaryUploadedFile("photo.jpg", "image/jpeg", 3, None)
+        upload.write(b"jpg")
+        upload.flush()
+        source = upload.temporary_file_path()
+        path = uploads.stage(upload)
+        self.addCleanup(os.remove, path)
+        self.assertFalse(os.path.exists(source))
+        with open(path, "rb") as file:
+            self.assertEqual(file.read(), b"jpg")
+        upload.close()
+
+    def test_rolled_back_upload_leaves_no_files(self):
+        """Без фиксации транзакции загрузка не попадает в очередь."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with override_settings(
+            IMAGE_UPLOAD_WORKERS=2, FILE_UPLOAD_TEMP_DIR=directory
+        ):
+            # TestCase не фиксирует транзакцию: on_commit не сработает.
+            self.create(self.jpeg("photo.jpg", (40, 30)))
+        post = Post.objects.get()
+        self.assertEqual(uploads.status(post.pk)["state"], "queued")
+        self.assertEqual(os.listdir(directory), [])
+
+    def test_failed_processing_reported_to_form(self):
+        """Ошибка обработки видна автору в форме и в статусе."""
+        post = Post.objects.create(text="Пост", author=self.user)
+        uploads.set_status(post.pk, "failed", 100, "Не удалось обработать")
+        response = self.client.get(reverse("posts:post_edit", args=[post.pk]))
+        self.assertContains(response, "Не удалось обработать")
+        response = self.client.get(
+            reverse("posts:image_status", args=[post.pk])
+        )
+        self.assertEqual(response.json()["state"], "failed")
+        self.client.force_login(User.objects.create_user(username="other"))
+        response = self.client.get(
+            reverse("posts:image_status", args=[post.pk])
+        )
+        self.assertRedirects(
+            response, reverse("posts:post_detail", args=[post.pk])
+        )
+
+
 class CommentFormTests(TestCase):
     @classmethod
     def setUpClass(cls):
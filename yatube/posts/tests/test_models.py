@@ -1,7 +1,7 @@
 from django.contrib.auth import get_user_model
 from django.test import Client, TestCase
 
-from posts.models import Group, Post
+from posts.models import Comment, Group, Post
 
 User = get_user_model()
 
@@ -103,3 +103,13 @@ class PostModelTest(TestCase):
         post = PostModelTest.post
         text = post.text
         self.assertEqual(str(post), text[:15], "Это не строка")
+
+    def test_save_keeps_comments_count(self):
+        """Полное сохранение поста не затирает счётчик комментариев."""
+        post = Post.objects.get(pk=PostModelTest.post.pk)
+        Comment.objects.create(post=post, author=self.user, text="Первый")
+        post.text = "Новый текст"
+        post.save()
+        post.refresh_from_db()
+        self.assertEqual(post.text, "Новый текст")
+        self.assertEqual(post.comments_count, 1)
@@ -0,0 +1,110 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+from posts.tests.utils import QueryBudgetMixin, scanned_table
+from posts.urls import app_name, urlpatterns
+
+User = get_user_model()
+
+# Запросов на URL при холодном кеше у авторизованного пользователя:
+# сессия и пользователь, ETag/Last-Modified, данные страницы.
+BUDGETS = {
+    "index": 5,
+    "group_posts": 7,
+    "follow_index": 4,
+    "profile_unfollow": 4,
+    "profile_follow": 3,
+    "profile": 8,
+    "post_detail": 7,
+    "post_create": 3,
+    "post_edit": 5,
+    "image_status": 3,
+    "add_comment": 6,
+    "post_comments": 7,
+    "search": 3,
+    "index_rss": 4,
+    "index_atom": 4,
+    "group_rss": 6,
+    "group_atom": 6,
+    "profile_rss": 6,
+    "profile_atom": 6,
+}
+QUERY_STRINGS = {"search": "?q=Пост"}
+NO_SCANS = ("posts_post", "posts_comment", "posts_follow")
+
+
+class QueryBudgetTest(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username="author")
+        cls.reader = User.objects.create_user(username="reader")
+        cls.group = Group.objects.create(
+            title="Группа", slug="budget", description="Описание"
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.post = Post.objects.create(
+            text="Пост", author=cls.author, group=cls.group
+        )
+
+    def setUp(self):
+        self.client.force_login(self.author)
+
+    def add_data(self, size):
+        for i in range(size):
+            post = Post.objects.create(
+                text=f"Пост {i}", author=self.author, group=self.group
+            )
+            Comment.objects.create(post=post, author=self.reader, text="!")
+            Comment.objects.create(
+                post=self.post, author=self.reader, text=f"Комментарий {i}"
+            )
+
+    def url(self, name, converters):
+        kwargs = {
+            "slug": self.group.slug,
+            "username": self.author.username,
+            "post_id": self.post.pk,
+        }
+        params = {key: kwargs[key] for key in converters}
+        url = reverse(f"{app_name}:{name}", kwargs=params)
+        return url + QUERY_STRINGS.get(name, "")
+
+    def test_every_url_has_budget(self):
+        """Для каждого URL из posts.urls задан бюджет запросов."""
+        self.assertEqual(
+            set(BUDGETS), {pattern.name for pattern in urlpatterns}
+        )
+
+    def test_query_budgets_do_not_grow_with_data(self):
+        """Число запросов не зависит от числа постов и комментариев."""
+        for size in (0, settings.PAR_PAGE * 2):
+            self.add_data(size)
+            for pattern in urlpatterns:
+                url = self.url(pattern.name, pattern.pattern.converters)
+                with self.subTest(size=size, url=url):
+                    cache.clear()
+                    with self.assertMaxQueries(
+                        BUDGETS[pattern.name], no_scans=NO_SCANS
+                    ):
+                        if pattern.name == "add_comment":
+                            self.client.post(url, {"text": "Бюджет"})
+                        else:
+                            self.client.get(url)
+
+    def test_plan_steps_parsed_for_all_sqlite_versions(self):
+        """Полный проход распознаётся в планах старых и новых SQLite."""
+        steps = {
+            "SCAN posts_post": "posts_post",
+            "SCAN TABLE posts_post": "posts_post",
+            "SCAN TABLE posts_post AS U0": "posts_post",
+            "SCAN posts_post USING INDEX post_date_id": None,
+            "SCAN TABLE posts_post USING COVERING INDEX post_date_id": None,
+            "SEARCH posts_post USING INTEGER PRIMARY KEY (rowid=?)": None,
+        }
+        for step, table in steps.items():
+            with self.subTest(step=step):
+                self.assertEqual(scanned_table(step), table)
@@ -1,15 +1,43 @@
+import os
 import shutil
 import tempfile
+import time
+from io import StringIO
+from unittest import mock, skipUnless
 
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import (
+    Client,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from PIL import features
+from sorl.thumbnail.models import KVStore
 
-from posts.models import Follow, Group, Post
+from posts import images, thumbnails, uploads
+from posts.models import (
+    Comment,
+    Follow,
+    Group,
+    ImageVariant,
+    Post,
+    StoredImage,
+    TimelineEntry,
+    UserStats,
+)
+from posts.paginator import NEXT, encode_cursor
+from posts.tests.utils import OnCommitMixin
+from posts.timeline import TimelinePaginator
 
 
 User = get_user_model()
@@ -19,7 +47,7 @@ TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
-class PagesTests(TestCase):
+class PagesTests(OnCommitMixin, TestCase):
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
@@ -196,19 +224,49 @@ class PagesTests(TestCase):
         )
 
     def test_cache_index_page(self):
-        """Запись остаётся"""
+        """Лента берётся из кеша, пока посты не менялись через модель."""
+        cache.clear()
         response = self.authorized_client.get(reverse("posts:index"))
         content = response.content
-        Post.objects.create(
-            text="Пост для проверки кеша",
-            author=self.user,
-        )
+        Post.objects.filter(pk=self.post.pk).update(text="Мимо сигналов")
         response = self.authorized_client.get(reverse("posts:index"))
         self.assertEqual(content, response.content)
         cache.clear()
         response = self.authorized_client.get(reverse("posts:index"))
         self.assertNotEqual(content, response.content)
 
+    def test_cache_invalidated_on_write(self):
+        """Новый пост сразу виден в закешированных лентах."""
+        cache.clear()
+        urls = [
+            reverse("posts:index"),
+            reverse("posts:group_posts", args=[self.group.slug]),
+            reverse("posts:profile", args=[self.user.username]),
+        ]
+        for url in urls:
+            self.authorized_client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(
+                text="Пост для проверки кеша",
+                author=self.user,
+                group=self.group,
+            )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                self.assertContains(response, "Пост для проверки кеша")
+
+    def test_cache_invalidated_on_group_change(self):
+        """Перенос поста в другую группу убирает его из старой."""
+        cache.clear()
+        post = PagesTests.createPost(text_for_post="Переезжающий пост")
+        url = reverse("posts:group_posts", args=[self.group.slug])
+        self.assertContains(self.authorized_client.get(url), post.text)
+        post.group = self.group_two
+        with self.captureOnCommitCallbacks(execute=True):
+            post.save()
+        self.assertNotContains(self.authorized_client.get(url), post.text)
+
 
 class PaginatorTest(TestCase):
     @classmethod
@@ -232,6 +290,9 @@ class PaginatorTest(TestCase):
         super().tearDownClass()
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
+    def setUp(self):
+        cache.clear()
+
     def test_first_page_containse_ten_records(self):
         response = self.client.get(reverse("posts:index"))
         self.assertEqual(
@@ -242,6 +303,130 @@ class PaginatorTest(TestCase):
         response = self.client.get(reverse("posts:index") + "?page=2")
         self.assertEqual(len(response.context.get("page_obj").object_list), 1)
 
+    def test_pages_cached_separately(self):
+        """Вторая страница не отдаёт закешированную первую."""
+        self.client.force_login(self.user)
+        first = self.client.get(reverse("posts:index"))
+        second = self.client.get(reverse("posts:index") + "?page=2")
+        self.assertNotEqual(first.content, second.content)
+
+
+@override_settings(CURSOR_PAGINATION=True)
+class CursorPaginatorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username="user")
+        cls.group = Group.objects.create(
+            title="Группа", slug="cursor-group", description="Описание"
+        )
+        Post.objects.bulk_create(
+            [
+                Post(text=f"Пост {i}", author=cls.user, group=cls.group)
+                for i in range(11)
+            ]
+        )
+        # Одинаковая дата у всех постов: порядок держится на id.
+        Post.objects.update(pub_date=Post.objects.first().pub_date)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(CursorPaginatorTest.user)
+
+    def test_pages_do_not_overlap(self):
+        """Курсор ведёт на следующую страницу и обратно без повторов."""
+        first = self.client.get(reverse("posts:index")).context["page_obj"]
+        self.assertEqual(len(first), 10)
+        self.assertTrue(first.has_next())
+        self.assertFalse(first.has_previous())
+        second = self.client.get(
+            reverse("posts:index"), {"cursor": first.next_cursor}
+        ).context["page_obj"]
+        self.assertEqual(len(second), 1)
+        self.assertFalse(second.has_next())
+        ids = [post.id for post in first] + [post.id for post in second]
+        expected = Post.objects.order_by("-id").values_list("id", flat=True)
+        self.assertEqual(ids, list(expected))
+        back = self.client.get(
+            reverse("posts:index"), {"cursor": second.previous_cursor}
+        ).context["page_obj"]
+        self.assertEqual(list(back), list(first))
+
+    def test_broken_cursor_returns_first_page(self):
+        """Битый курсор отдаёт первую страницу."""
+        too_large = encode_cursor(NEXT, timezone.now(), 10 ** 23)
+        for cursor in ("!!", too_large):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(
+                    reverse("posts:index"), {"cursor": cursor}
+                )
+                self.assertEqual(len(response.context["page_obj"]), 10)
+
+    def test_all_feeds_use_cursor(self):
+        """Все ленты работают в курсорном режиме."""
+        Follow.objects.create(
+            user=User.objects.create(username="reader"), author=self.user
+        )
+        self.client.force_login(User.objects.get(username="reader"))
+        urls = [
+            reverse("posts:index"),
+            reverse("posts:group_posts", args=[self.group.slug]),
+            reverse("posts:profile", args=[self.user.username]),
+            reverse("posts:follow_index"),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                page_obj = self.client.get(url).context["page_obj"]
+                self.assertTrue(page_obj.cursor_based)
+                self.assertEqual(len(page_obj), 10)
+
+
+class FeedQueriesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username="author")
+        cls.reader = User.objects.create_user(username="reader")
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        groups = [
+            Group.objects.create(
+                title=f"Группа {i}", slug=f"group-{i}", description="-"
+            )
+            for i in range(3)
+        ]
+        Post.objects.bulk_create(
+            [
+                Post(text=f"Пост {i}", author=cls.author, group=groups[i % 3])
+                for i in range(25)
+            ]
+        )
+        cls.urls = [
+            reverse("posts:index"),
+            reverse("posts:group_posts", args=[groups[0].slug]),
+            reverse("posts:profile", args=[cls.author.username]),
+            reverse("posts:follow_index"),
+        ]
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(FeedQueriesTest.reader)
+
+    def count_queries(self, url, per_page):
+        cache.clear()
+        with override_settings(PAR_PAGE=per_page):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+        self.assertEqual(len(response.context["page_obj"]), per_page)
+        return len(queries)
+
+    def test_feed_query_count_does_not_depend_on_page_size(self):
+        """Число запросов ленты не растёт с размером страницы."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertEqual(
+                    self.count_queries(url, 2), self.count_queries(url, 8)
+                )
+
 
 class FollowViewsTest(TestCase):
     @classmethod
@@ -301,3 +486,774 @@ class FollowViewsTest(TestCase):
         response = self.authorized_user.get(reverse("posts:follow_index"))
         posts = response.context["page_obj"]
         self.assertNotIn(self.post, posts)
+
+
+@override_settings(
+    FOLLOW_TIMELINE=True, TIMELINE_FANOUT_LIMIT=1, TIMELINE_WORKERS=0
+)
+class TimelineTest(OnCommitMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username="author")
+        cls.reader = User.objects.create_user(username="reader")
+        cls.post = Post.objects.create(text="Старый пост", author=cls.author)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(TimelineTest.reader)
+
+    def publish(self, text, author=None):
+        """Пост, разложенный по лентам как после фиксации транзакции."""
+        with self.captureOnCommitCallbacks(execute=True):
+            return Post.objects.create(
+                text=text, author=author or self.author
+            )
+
+    def feed(self):
+        response = self.client.get(reverse("posts:follow_index"))
+        return list(response.context["page_obj"])
+
+    def test_follow_backfills_timeline(self):
+        """После подписки в ленте появляются старые посты автора."""
+        self.client.get(
+            reverse("posts:profile_follow", args=[self.author.username])
+        )
+        self.assertTrue(
+            TimelineEntry.objects.filter(
+                user=self.reader, post=self.post
+            ).exists()
+        )
+        self.assertEqual(self.feed(), [self.post])
+
+    def test_new_post_fanned_out(self):
+        """Новый пост раскладывается по лентам подписчиков."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = self.publish("Новый пост")
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.reader, post=post).exists()
+        )
+        self.assertEqual(self.feed(), [post, self.post])
+
+    def test_fan_out_after_commit(self):
+        """Пост раскладывается по лентам только после фиксации."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        with self.captureOnCommitCallbacks() as callbacks:
+            post = Post.objects.create(text="Новый пост", author=self.author)
+        entries = TimelineEntry.objects.filter(post=post)
+        self.assertFalse(entries.exists())
+        for callback in callbacks:
+            callback()
+        self.assertTrue(entries.filter(user=self.reader).exists())
+
+    def test_unfollow_cleans_timeline(self):
+        """После отписки посты автора пропадают из ленты."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.client.get(
+            reverse("posts:profile_unfollow", args=[self.author.username])
+        )
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.reader).exists()
+        )
+        self.assertEqual(self.feed(), [])
+
+    def test_popular_author_read_on_request(self):
+        """Посты популярного автора не раскладываются, но видны в ленте."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(
+            user=User.objects.create_user(username="other"),
+            author=self.author,
+        )
+        post = self.publish("Популярный пост")
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        self.assertEqual(self.feed(), [post, self.post])
+
+    @override_settings(TIMELINE_LENGTH=2)
+    def test_timeline_trimmed(self):
+        """В ленте хранится не больше TIMELINE_LENGTH постов."""
+        self.publish("Второй пост")
+        self.publish("Третий пост")
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 2
+        )
+
+    @override_settings(TIMELINE_LENGTH=2)
+    def test_fan_out_trims_timeline(self):
+        """Новые посты вытесняют из ленты самые старые."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        posts = [
+            self.publish(f"Пост {i}")
+            for i in range(3)
+        ]
+        entries = TimelineEntry.objects.filter(user=self.reader)
+        self.assertEqual(
+            set(entries.values_list("post_id", flat=True)),
+            {posts[1].pk, posts[2].pk},
+        )
+
+    def test_popular_posts_stay_after_losing_followers(self):
+        """Посты, не разложенные по лентам, не пропадают после отписок."""
+        other = User.objects.create_user(username="other")
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=other, author=self.author)
+        post = self.publish("Популярный пост")
+        Follow.objects.filter(user=other).delete()
+        later = self.publish("Поздний пост")
+        self.assertEqual(self.feed(), [later, post, self.post])
+
+    @override_settings(PAR_PAGE=2)
+    def test_pages_merge_timeline_and_popular_authors(self):
+        """Страницы по курсору сливают ленту и популярных авторов."""
+        popular = User.objects.create_user(username="popular")
+        for username in ("first", "second"):
+            Follow.objects.create(
+                user=User.objects.create_user(username=username),
+                author=popular,
+            )
+        Follow.objects.create(user=self.reader, author=popular)
+        Follow.objects.create(user=self.reader, author=self.author)
+        expected = [self.post]
+        for i in range(4):
+            author = popular if i % 2 else self.author
+            expected.append(self.publish(f"Пост {i}", author))
+        expected.reverse()
+        pages, cursor = [], ""
+        with self.assertNumQueries(4):
+            page = TimelinePaginator(
+                Post.objects.for_feed(), 2, self.reader
+            ).get_page(cursor)
+            list(page)
+        while True:
+            page = TimelinePaginator(
+                Post.objects.for_feed(), 2, self.reader
+            ).get_page(cursor)
+            pages.extend(page)
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+        self.assertEqual(pages, expected)
+        previous = TimelinePaginator(
+            Post.objects.for_feed(), 2, self.reader
+        ).get_page(page.previous_cursor)
+        self.assertEqual(list(previous), expected[2:4])
+
+
+class UserStatsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username="author")
+        cls.reader = User.objects.create_user(username="reader")
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(UserStatsTest.reader)
+
+    def profile_counts(self, user):
+        response = self.client.get(
+            reverse("posts:profile", args=[user.username])
+        )
+        return (
+            response.context["counter_posts"],
+            response.context["followers_count"],
+            response.context["following_count"],
+        )
+
+    def test_counters_follow_writes(self):
+        """Счётчики профиля меняются вместе с постами и подписками."""
+        post = Post.objects.create(text="Пост", author=self.author)
+        Post.objects.create(text="Ещё пост", author=self.author)
+        self.client.get(
+            reverse("posts:profile_follow", args=[self.author.username])
+        )
+        self.assertEqual(self.profile_counts(self.author), (2, 1, 0))
+        self.assertEqual(self.profile_counts(self.reader), (0, 0, 1))
+        post.delete()
+        self.client.get(
+            reverse("posts:profile_unfollow", args=[self.author.username])
+        )
+        self.assertEqual(self.profile_counts(self.author), (1, 0, 0))
+        self.assertEqual(self.profile_counts(self.reader), (0, 0, 0))
+
+    def test_profile_reads_counters_from_stats(self):
+        """Профиль берёт счётчики из UserStats без COUNT по постам."""
+        Post.objects.create(text="Пост", author=self.author)
+        UserStats.objects.filter(user=self.author).update(posts_count=42)
+        self.assertEqual(self.profile_counts(self.author)[0], 42)
+        response = self.client.get(
+            reverse(
+                "posts:post_detail", args=[self.author.posts.first().pk]
+            )
+        )
+        self.assertEqual(response.context["counter_posts"], 42)
+
+    def test_drifted_counter_not_negative(self):
+        """Удаление при счётчике, разошедшемся до нуля, не падает."""
+        post = Post.objects.create(text="Пост", author=self.author)
+        UserStats.objects.filter(user=self.author).update(posts_count=0)
+        post.delete()
+        self.assertEqual(self.profile_counts(self.author)[0], 0)
+
+    def test_recount_stats_repairs_drift(self):
+        """Команда recount_stats исправляет расхождения."""
+        Post.objects.create(text="Пост", author=self.author)
+        UserStats.objects.filter(user=self.author).update(posts_count=42)
+        Post.objects.bulk_create([Post(text="Мимо", author=self.reader)])
+        call_command("recount_stats", stdout=StringIO())
+        self.assertEqual(self.profile_counts(self.author)[0], 1)
+        self.assertEqual(self.profile_counts(self.reader)[0], 1)
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0, IMAGE_UPLOAD_WORKERS=0
+)
+class ThumbnailTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="user")
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def image(self, name):
+        small_gif = (
+            b"\x47\x49\x46\x38\x39\x61\x02\x00"
+            b"\x01\x00\x80\x00\x00\x00\x00\x00"
+            b"\xFF\xFF\xFF\x21\xF9\x04\x00\x00"
+            b"\x00\x00\x00\x2C\x00\x00\x00\x00"
+            b"\x02\x00\x01\x00\x00\x02\x02\x0C"
+            b"\x0A\x00\x3B"
+        )
+        return SimpleUploadedFile(
+            name=name, content=small_gif, content_type="image/gif"
+        )
+
+    def test_placeholder_until_thumbnail_ready(self):
+        """Лента не создаёт миниатюру, а показывает заглушку."""
+        Post.objects.create(
+            text="Пост", author=self.user, image=self.image("wait.gif")
+        )
+        response = self.client.get(reverse("posts:index"))
+        self.assertContains(response, "Изображение обрабатывается")
+
+    def test_thumbnail_generated_after_create(self):
+        """Миниатюра создаётся после сохранения поста."""
+        self.client.post(
+            reverse("posts:post_create"),
+            {"text": "Пост", "image": self.image("ready.gif")},
+        )
+        response = self.client.get(reverse("posts:index"))
+        self.assertNotContains(response, "Изображение обрабатывается")
+        self.assertContains(response, '<img class="card-img my-2"')
+        self.assertContains(response, 'loading="lazy"')
+        for width in settings.POST_IMAGE_WIDTHS:
+            self.assertContains(response, f" {width}w")
+        self.assertEqual(
+            ImageVariant.objects.count(),
+            len(thumbnails.image_formats()) * len(settings.POST_IMAGE_WIDTHS),
+        )
+
+    @skipUnless(features.check("webp"), "Pillow собран без WebP")
+    def test_webp_source_with_jpeg_fallback(self):
+        """WebP отдаётся через <source>, JPEG остаётся в <img>."""
+        self.client.post(
+            reverse("posts:post_create"),
+            {"text": "Пост", "image": self.image("webp.gif")},
+        )
+        response = self.client.get(reverse("posts:index"))
+        self.assertContains(response, '<source type="image/webp"')
+        self.assertContains(response, ".jpg 960w")
+
+    def test_srcset_built_from_records(self):
+        """Разметка строится по записям вариантов без хранилища."""
+        post = Post.objects.create(text="Пост", author=self.user)
+        Post.objects.filter(pk=post.pk).update(image="posts/gone.gif")
+        ImageVariant.objects.bulk_create(
+            ImageVariant(
+                source="posts/gone.gif",
+                format="JPEG",
+                width=width,
+                height=width // 3,
+                name=f"cache/gone-{width}.jpg",
+            )
+            for width in (320, 960)
+        )
+        response = self.client.get(reverse("posts:index"))
+        self.assertContains(response, 'src="/media/cache/gone-960.jpg"')
+        self.assertContains(
+            response,
+            'srcset="/media/cache/gone-320.jpg 320w, '
+            '/media/cache/gone-960.jpg 960w"',
+        )
+
+    def test_variants_loaded_once_per_page(self):
+        """Варианты всех карточек страницы читаются одним запросом."""
+        for number in range(5):
+            name = f"posts/page-{number}.gif"
+            post = Post.objects.create(text="Пост", author=self.user)
+            Post.objects.filter(pk=post.pk).update(image=name)
+            ImageVariant.objects.create(
+                source=name,
+                format="JPEG",
+                width=320,
+                height=113,
+                name=f"cache/page-{number}.jpg",
+            )
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("posts:index"))
+        self.assertContains(response, "/media/cache/page-4.jpg 320w")
+        variant_queries = [
+            query["sql"]
+            for query in queries
+            if "posts_imagevariant" in query["sql"]
+        ]
+        self.assertEqual(len(variant_queries), 1)
+
+    def test_thumbnail_metadata_stored_in_database(self):
+        """Метаданные миниатюр sorl-thumbnail сохраняются в базе."""
+        self.client.post(
+            reverse("posts:post_create"),
+            {"text": "Пост", "image": self.image("stored.gif")},
+        )
+        self.assertTrue(KVStore.objects.exists())
+
+    def test_generate_thumbnails_fills_missing_widths(self):
+        """Команда досоздаёт варианты для новых ширин."""
+        self.client.post(
+            reverse("posts:post_create"),
+            {"text": "Пост", "image": self.image("widths.gif")},
+        )
+        name = Post.objects.get().image.name
+        self.assertEqual(thumbnails.missing_variants(name), [])
+        with override_settings(POST_IMAGE_WIDTHS=(320, 480, 640, 960)):
+            call_command("generate_thumbnails", stdout=StringIO())
+            self.assertEqual(thumbnails.missing_variants(name), [])
+
+    def test_duplicate_uploads_share_file_and_variants(self):
+        """Одинаковые картинки хранятся и обрабатываются один раз."""
+        for name in ("first.gif", "second.gif"):
+            self.client.post(
+                reverse("posts:post_create"),
+                {"text": "Пост", "image": self.image(name)},
+            )
+        first, second = Post.objects.order_by("pk")
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name, r"^posts/\w\w/\w\w/\w{64}\.gif$")
+        self.assertEqual(StoredImage.objects.get().refs, 2)
+        self.assertEqual(
+            ImageVariant.objects.count(),
+            len(thumbnails.image_formats()) * len(settings.POST_IMAGE_WIDTHS),
+        )
+        path = first.image.path
+        first.delete()
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(StoredImage.objects.get().refs, 1)
+        second.delete()
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(StoredImage.objects.exists())
+        self.assertFalse(ImageVariant.objects.exists())
+
+    def test_removal_skipped_for_retained_image(self):
+        """Картинку, которую успели загрузить заново, не удаляют."""
+        post = Post.objects.create(
+            text="Пост", author=self.user, image=self.image("kept.gif")
+        )
+        images.remove_files(post.image.name)
+        self.assertTrue(os.path.exists(post.image.path))
+        self.assertEqual(StoredImage.objects.get().refs, 1)
+
+    def test_upload_restores_file_removed_concurrently(self):
+        """Загрузка кладёт файл заново, если его удалили до ссылки."""
+        post = Post.objects.create(text="Пост", author=self.user)
+        path = uploads.stage(self.image("race.gif"))
+        retain = images.retain
+
+        def retain_after_removal(name):
+            # Удаление прошло между записью файла и ссылкой на него.
+            post.image.storage.delete(name)
+            retain(name)
+
+        with mock.patch.object(images, "retain", retain_after_removal):
+            uploads.process(post.pk, path, "race.gif")
+        post.refresh_from_db()
+        self.assertTrue(os.path.exists(post.image.path))
+        self.assertEqual(uploads.status(post.pk)["state"], "done")
+
+    def test_edit_moves_reference(self):
+        """Замена картинки в посте переносит ссылку на новый файл."""
+        post = Post.objects.create(
+            text="Пост", author=self.user, image=self.image("old.gif")
+        )
+        old_name = post.image.name
+        post.image = SimpleUploadedFile(
+            "new.gif", self.image("new.gif").read() + b"\x00"
+        )
+        post.save()
+        self.assertEqual(
+            list(StoredImage.objects.values_list("name", "refs")),
+            [(post.image.name, 1)],
+        )
+        self.assertFalse(post.image.storage.exists(old_name))
+
+    def test_recount_stats_repairs_image_refs(self):
+        """recount_stats восстанавливает счётчики после bulk_create."""
+        post = Post.objects.create(
+            text="Пост", author=self.user, image=self.image("bulk.gif")
+        )
+        Post.objects.bulk_create(
+            [Post(text="Копия", author=self.user, image=post.image.name)]
+        )
+        call_command("recount_stats", stdout=StringIO())
+        self.assertEqual(StoredImage.objects.get().refs, 2)
+
+
+class AnonymousPageCacheTest(OnCommitMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="author")
+        cls.group = Group.objects.create(
+            title="Группа", slug="page-cache", description="Описание"
+        )
+        cls.post = Post.objects.create(
+            text="Пост", author=cls.user, group=cls.group
+        )
+        cls.urls = [
+            reverse("posts:index"),
+            reverse("posts:group_posts", args=[cls.group.slug]),
+            reverse("posts:profile", args=[cls.user.username]),
+            reverse("posts:post_detail", args=[cls.post.id]),
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_pages_served_from_cache(self):
+        """Повторный анонимный запрос не обращается к базе."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                content = self.client.get(url).content
+                with self.assertNumQueries(0):
+                    response = self.client.get(url)
+                self.assertEqual(response.content, content)
+                self.assertIn("feed", response["Surrogate-Key"].split())
+
+    def test_write_purges_affected_pages(self):
+        """Запись сбрасывает только страницы со своими ключами."""
+        for url in self.urls:
+            self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(
+                post=self.post, author=self.user, text="Новый комментарий"
+            )
+        detail = self.client.get(self.urls[3])
+        self.assertContains(detail, "Новый комментарий")
+        self.client.get(self.urls[1])
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(text="Пост без группы", author=self.user)
+        self.assertContains(self.client.get(self.urls[0]), "Пост без группы")
+        with self.assertNumQueries(0):
+            self.client.get(self.urls[1])
+
+    def test_authenticated_pages_not_cached(self):
+        """Страницы авторизованных пользователей не кешируются."""
+        self.client.force_login(self.user)
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.client.get(url)
+                self.assertIsNotNone(self.client.get(url).context)
+
+
+class ConditionalGetTest(OnCommitMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="author")
+        cls.group = Group.objects.create(
+            title="Группа", slug="etag", description="Описание"
+        )
+        cls.post = Post.objects.create(
+            text="Пост", author=cls.user, group=cls.group
+        )
+        Follow.objects.create(
+            user=User.objects.create_user(username="reader"), author=cls.user
+        )
+        cls.urls = [
+            reverse("posts:index"),
+            reverse("posts:group_posts", args=[cls.group.slug]),
+            reverse("posts:profile", args=[cls.user.username]),
+            reverse("posts:post_detail", args=[cls.post.id]),
+            reverse("posts:follow_index"),
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(User.objects.get(username="reader"))
+
+    @staticmethod
+    def later(seconds):
+        """Часы core.cache, ушедшие вперёд на seconds секунд."""
+        now = time.time() + seconds
+        return mock.patch("core.cache.time", mock.Mock(time=lambda: now))
+
+    def test_not_modified_without_rendering(self):
+        """По совпавшему ETag страница отвечает 304 без шаблонов."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.client.get(url)
+                with self.later(2):
+                    response = self.client.get(url)
+                self.assertTrue(response.has_header("Last-Modified"))
+                response = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=response["ETag"]
+                )
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.templates, [])
+
+    def test_etag_changes_on_write(self):
+        """Новый комментарий и новый пост меняют ETag."""
+        etags = {url: self.client.get(url)["ETag"] for url in self.urls}
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(post=self.post, author=self.user, text="!")
+            Post.objects.create(text="Ещё пост", author=self.user)
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_last_modified_moves_on_edit(self):
+        """Правка поста сдвигает Last-Modified всех его страниц."""
+        for url in self.urls:
+            self.client.get(url)
+        with self.later(2):
+            dates = {
+                url: self.client.get(url)["Last-Modified"]
+                for url in self.urls
+            }
+        for url, date in dates.items():
+            with self.subTest(url=url), self.later(2):
+                response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=date)
+                self.assertEqual(response.status_code, 304)
+        with self.later(3):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.post.text = "Правка"
+                self.post.save()
+            # В секунду правки дата не отдаётся: она точна до секунды.
+            self.assertFalse(
+                self.client.get(self.urls[0]).has_header("Last-Modified")
+            )
+        for url, date in dates.items():
+            with self.subTest(url=url), self.later(5):
+                response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=date)
+                self.assertEqual(response.status_code, 200)
+
+    def test_etag_depends_on_user(self):
+        """Разные пользователи получают разные ETag."""
+        etag = self.client.get(self.urls[0])["ETag"]
+        self.client.force_login(self.user)
+        self.assertNotEqual(self.client.get(self.urls[0])["ETag"], etag)
+
+    def test_anonymous_cached_page_not_modified(self):
+        """Страница из кеша анонимных страниц тоже отвечает 304."""
+        self.client.logout()
+        etag = self.client.get(self.urls[0])["ETag"]
+        with self.assertNumQueries(0):
+            response = self.client.get(self.urls[0], HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+
+class SearchTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="searcher")
+        self.client.force_login(self.user)
+        self.best = Post.objects.create(
+            text="Ёлка ёлка ёлка в лесу", author=self.user
+        )
+        self.other = Post.objects.create(
+            text="В лесу родилась ёлочка", author=self.user
+        )
+        Post.objects.create(text="Про море", author=self.user)
+
+    def search(self, query, **params):
+        response = self.client.get(
+            reverse("posts:search"), {"q": query, **params}
+        )
+        return response.context["page_obj"]
+
+    def test_ranked_prefix_search(self):
+        """Поиск по префиксу без учёта регистра, лучшие совпадения первыми."""
+        self.assertEqual(list(self.search("ЁЛК")), [self.best])
+        # Ёлка встречается в первом посте трижды, ёлочка во втором — раз.
+        self.assertEqual(list(self.search("ёл")), [self.best, self.other])
+        self.assertEqual(list(self.search("лес ёлоч")), [self.other])
+
+    def test_index_follows_writes(self):
+        """Триггеры обновляют индекс при правке и удалении поста."""
+        self.other.text = "Про горы"
+        self.other.save()
+        self.assertEqual(list(self.search("гор")), [self.other])
+        self.assertEqual(list(self.search("ёлоч")), [])
+        self.other.delete()
+        self.assertEqual(list(self.search("гор")), [])
+
+    def test_migrate_restores_triggers(self):
+        """После migrate триггеры индекса на месте, даже если их не было."""
+        with connection.cursor() as cursor:
+            for action in ("insert", "delete", "update"):
+                cursor.execute(f"DROP TRIGGER posts_post_fts_{action}")
+        call_command("migrate", verbosity=0)
+        post = Post.objects.create(text="Про горы", author=self.user)
+        self.assertEqual(list(self.search("гор")), [post])
+
+    def test_query_syntax_is_escaped(self):
+        """Операторы FTS5 и кавычки в запросе не вызывают ошибок."""
+        for query in ('"ёлка', "NOT лес", "лес*) OR (", "", "!!!"):
+            with self.subTest(query=query):
+                response = self.client.get(
+                    reverse("posts:search"), {"q": query}
+                )
+                self.assertEqual(response.status_code, 200)
+
+    @override_settings(PAR_PAGE=1)
+    def test_cursor_keeps_query(self):
+        """Курсор по рангу проходит все результаты, ссылки хранят запрос."""
+        first = self.search("ёл")
+        second = self.search("ёл", cursor=first.next_cursor)
+        self.assertEqual(list(first) + list(second), [self.best, self.other])
+        self.assertFalse(second.has_next())
+        back = self.search("ёл", cursor=second.previous_cursor)
+        self.assertEqual(list(back), [self.best])
+        response = self.client.get(reverse("posts:search"), {"q": "ёл"})
+        self.assertContains(response, "?q=%D1%91%D0%BB&amp;cursor=")
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке идёт через полнотекстовый индекс."""
+        self.user.is_staff = self.user.is_superuser = True
+        self.user.save()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse("admin:posts_post_changelist"), {"q": "ёлоч"}
+            )
+        results = response.context["cl"].result_list
+        self.assertEqual(list(results), [self.other])
+        sql = [query["sql"] for query in queries.captured_queries]
+        self.assertTrue(any(" MATCH " in query for query in sql))
+
+
+class CommentsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="commenter")
+        self.client.force_login(self.user)
+        self.post = Post.objects.create(text="Пост", author=self.user)
+
+    def comment(self, count):
+        for i in range(count):
+            Comment.objects.create(
+                post=self.post, author=self.user, text=f"Комментарий {i}"
+            )
+
+    def test_comments_count(self):
+        """Счётчик комментариев меняется сигналами и чинится командой."""
+        self.comment(3)
+        Comment.objects.first().delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 2)
+        Post.objects.update(comments_count=10)
+        call_command("recount_stats", stdout=StringIO())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 2)
+
+    @override_settings(COMMENTS_PAR_PAGE=2)
+    def test_load_more(self):
+        """Комментарии выводятся порциями, следующая — отдельным фрагментом."""
+        self.comment(3)
+        url = reverse("posts:post_detail", args=(self.post.id,))
+        response = self.client.get(url)
+        first = response.context["comments"]
+        self.assertEqual(
+            [comment.text for comment in first],
+            ["Комментарий 0", "Комментарий 1"],
+        )
+        partial_url = reverse("posts:post_comments", args=(self.post.id,))
+        self.assertContains(
+            response, f"{partial_url}?cursor={first.next_cursor}"
+        )
+        partial = self.client.get(partial_url, {"cursor": first.next_cursor})
+        self.assertEqual(
+            [comment.text for comment in partial.context["comments"]],
+            ["Комментарий 2"],
+        )
+        self.assertNotContains(partial, "<html")
+        self.assertNotContains(partial, "comments-more")
+
+
+class SyndicationFeedsTest(OnCommitMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username="writer")
+        self.group = Group.objects.create(
+            title="Группа", slug="feeds", description="Описание"
+        )
+        self.other_group = Group.objects.create(
+            title="Другая", slug="other-feeds", description="Описание"
+        )
+        self.post = Post.objects.create(
+            text="Пост в ленте", author=self.author, group=self.group
+        )
+        self.urls = {
+            reverse("posts:index_rss"): "application/rss+xml",
+            reverse("posts:index_atom"): "application/atom+xml",
+            reverse("posts:group_rss", args=("feeds",)): "application/rss",
+            reverse("posts:group_atom", args=("feeds",)): "application/atom",
+            reverse("posts:profile_rss", args=("writer",)): "application/rss",
+            reverse(
+                "posts:profile_atom", args=("writer",)
+            ): "application/atom",
+        }
+
+    def test_feeds_list_posts(self):
+        for url, content_type in self.urls.items():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertIn(content_type, response["Content-Type"])
+                self.assertContains(response, "Пост в ленте")
+                self.assertContains(
+                    response,
+                    reverse("posts:post_detail", args=(self.post.pk,)),
+                )
+
+    def test_polling_costs_304_until_new_post(self):
+        """Повторный опрос даёт 304, пока в ленте не появится пост."""
+        url = reverse("posts:group_rss", args=("feeds",))
+        etag = self.client.get(url)["ETag"]
+        self.assertFalse(etag.startswith("W/"))
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(
+                text="Чужая группа", author=self.author, group=self.other_group
+            )
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(
+                text="Новый пост", author=self.author, group=self.group
+            )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Новый пост")
+
+    def test_anonymous_feed_is_cached(self):
+        url = reverse("posts:profile_atom", args=("writer",))
+        first = self.client.get(url)
+        with self.assertNumQueries(0):
+            cached = self.client.get(url)
+        self.assertEqual(cached.content, first.content)
+        self.assertEqual(cached["Content-Type"], first["Content-Type"])
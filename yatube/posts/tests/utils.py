@@ -0,0 +1,69 @@
+import re
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+
+# Шаг плана SQLite: «SCAN posts_post», в старых версиях «SCAN TABLE ...».
+SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)")
+USING_INDEX = re.compile(r"\bUSING (?:COVERING )?INDEX\b")
+
+
+def scanned_table(step):
+    """Таблица, которую шаг плана читает полным проходом без индекса."""
+    match = SCAN.match(step)
+    if match is None or USING_INDEX.search(step):
+        return None
+    return match.group(1)
+
+
+class OnCommitMixin:
+    """Обработчики on_commit внутри транзакции TestCase.
+
+    Повторяет TestCase.captureOnCommitCallbacks из новых версий Django.
+    """
+
+    @contextmanager
+    def captureOnCommitCallbacks(self, using=DEFAULT_DB_ALIAS, execute=False):
+        callbacks = []
+        start = len(connections[using].run_on_commit)
+        try:
+            yield callbacks
+        finally:
+            registered = connections[using].run_on_commit[start:]
+            callbacks[:] = [func for _, func in registered]
+            if execute:
+                for callback in callbacks:
+                    callback()
+
+
+class QueryBudgetMixin:
+    """Проверки числа SQL-запросов и полных проходов по таблицам."""
+
+    @contextmanager
+    def assertMaxQueries(self, budget, using="default", no_scans=()):
+        """Не больше budget запросов внутри блока.
+
+        no_scans перечисляет таблицы, которые нельзя читать полным
+        проходом без индекса (проверяется только на SQLite).
+        """
+        connection = connections[using]
+        with CaptureQueriesContext(connection) as captured:
+            yield captured
+        sql = [query["sql"] for query in captured.captured_queries]
+        if len(sql) > budget:
+            self.fail(
+                f"{len(sql)} запросов вместо не более {budget}:\n"
+                + "\n".join(f"{i}. {query}" for i, query in enumerate(sql, 1))
+            )
+        if no_scans and connection.vendor == "sqlite":
+            for query in sql:
+                if not query.startswith("SELECT"):
+                    continue
+                with connection.cursor() as cursor:
+                    cursor.execute(f"EXPLAIN QUERY PLAN {query}")
+                    plan = [row[-1] for row in cursor.fetchall()]
+                for step in plan:
+                    table = scanned_table(step)
+                    if table in no_scans:
+                        self.fail(f"Полный проход по {table}:\n{query}")
@@ -0,0 +1,174 @@
+"""Фоновая подготовка миниатюр картинок постов.
+
+Для каждой ширины из POST_IMAGE_WIDTHS и формата из POST_IMAGE_FORMATS
+пул потоков после сохранения поста создаёт копию картинки и записывает
+её в ImageVariant. Шаблон строит srcset по этим записям, загружая их
+одним запросом на страницу ленты, и показывает заглушку, пока их нет,
+так что ни обработка картинок, ни проверки хранилища в запросе ленты
+не выполняются.
+"""
+import logging
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from PIL import Image
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+
+from core import workers
+from core.cache import bump_versions
+
+from .cache import post_scopes
+from .models import ImageVariant, Post
+
+logger = logging.getLogger(__name__)
+
+MIME_TYPES = {"WEBP": "image/webp", "JPEG": "image/jpeg", "PNG": "image/png"}
+
+backend = ThumbnailBackend()
+_pending = set()
+_lock = threading.Lock()
+
+
+def srcset(variants):
+    return ", ".join(
+        f"{default.storage.url(variant.name)} {variant.width}w"
+        for variant in variants
+    )
+
+
+class ResponsiveImage:
+    """Готовые варианты картинки для <picture>.
+
+    sources — пары (MIME-тип, srcset) для <source>, последний формат
+    из POST_IMAGE_FORMATS служит запасным src/srcset для <img>.
+    """
+
+    def __init__(self, variants):
+        self.sizes = settings.POST_IMAGE_SIZES
+        by_format = {}
+        for variant in sorted(variants, key=lambda variant: variant.width):
+            by_format.setdefault(variant.format, []).append(variant)
+        fallback = next(
+            name
+            for name in reversed(settings.POST_IMAGE_FORMATS)
+            if name in by_format
+        )
+        self.sources = [
+            (MIME_TYPES[name], srcset(by_format[name]))
+            for name in settings.POST_IMAGE_FORMATS
+            if name in by_format and name != fallback
+        ]
+        self.srcset = srcset(by_format[fallback])
+        largest = by_format[fallback][-1]
+        self.src = default.storage.url(largest.name)
+        self.width = largest.width
+        self.height = largest.height
+
+
+def load_variants(names):
+    """{имя: ResponsiveImage} для картинок names, у которых есть варианты."""
+    by_source = {}
+    variants = ImageVariant.objects.filter(
+        source__in=names, format__in=settings.POST_IMAGE_FORMATS
+    )
+    for variant in variants:
+        by_source.setdefault(variant.source, []).append(variant)
+    return {
+        source: ResponsiveImage(variants)
+        for source, variants in by_source.items()
+    }
+
+
+def get_variants(image):
+    """ResponsiveImage по записям ImageVariant или None, пока их нет."""
+    return load_variants([image.name]).get(image.name)
+
+
+def page_variants(page):
+    """Варианты картинок всех постов страницы одним запросом.
+
+    Результат запоминается на странице, и карточки постов, которые
+    шаблоны подключают по одной, берут варианты из него.
+    """
+    variants = getattr(page, "image_variants", None)
+    if variants is None:
+        names = {post.image.name for post in page if post.image}
+        variants = load_variants(names) if names else {}
+        page.image_variants = variants
+    return variants
+
+
+def image_formats():
+    """Форматы из POST_IMAGE_FORMATS, которые умеет сохранять Pillow."""
+    Image.init()
+    return [name for name in settings.POST_IMAGE_FORMATS if name in Image.SAVE]
+
+
+def geometry(width):
+    """Размер варианта с пропорциями POST_THUMBNAIL_GEOMETRY."""
+    base_width, base_height = map(
+        int, settings.POST_THUMBNAIL_GEOMETRY.split("x")
+    )
+    return f"{width}x{round(width * base_height / base_width)}"
+
+
+def missing_variants(name):
+    ready = set(
+        ImageVariant.objects.filter(source=name).values_list("format", "width")
+    )
+    return [
+        (image_format, width)
+        for image_format in image_formats()
+        for width in settings.POST_IMAGE_WIDTHS
+        if (image_format, width) not in ready
+    ]
+
+
+def generate(name):
+    try:
+        variants = []
+        for image_format, width in missing_variants(name):
+            thumbnail = backend.get_thumbnail(
+                name,
+                geometry(width),
+                format=image_format,
+                **settings.POST_THUMBNAIL,
+            )
+            variants.append(
+                ImageVariant(
+                    source=name,
+                    format=image_format,
+                    width=width,
+                    height=thumbnail.height,
+                    name=thumbnail.name,
+                )
+            )
+        ImageVariant.objects.bulk_create(variants, ignore_conflicts=True)
+        # В закешированных лентах вместо заглушки должна появиться картинка.
+        scopes = []
+        for post in Post.objects.filter(image=name).only("author", "group"):
+            scopes.extend(post_scopes(post))
+        bump_versions(*scopes)
+    except Exception:
+        logger.exception("Не удалось создать миниатюру %s", name)
+    finally:
+        with _lock:
+            _pending.discard(name)
+
+
+def submit(name):
+    """Ставит миниатюру в очередь, если она уже не готовится."""
+    with _lock:
+        if name in _pending:
+            return
+        _pending.add(name)
+    workers.run("THUMBNAIL_WORKERS", generate, name)
+
+
+def enqueue(image):
+    """Подготовить миниатюру после фиксации транзакции."""
+    if image:
+        name = image.name
+        transaction.on_commit(lambda: submit(name))
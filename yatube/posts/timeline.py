@@ -0,0 +1,155 @@
+"""Материализованная лента подписок (fan-out on write).
+
+Новый пост раскладывается по лентам подписчиков автора после фиксации
+публикации в пуле из TIMELINE_WORKERS потоков, поэтому страница
+подписок читается по индексу
+(user, pub_date, post) без соединения с posts_follow. Посты авторов, у
+которых подписчиков больше TIMELINE_FANOUT_LIMIT, не раскладываются, а
+подмешиваются при чтении (fan-out on read) отдельным запросом на автора,
+не длиннее страницы.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Subquery
+
+from core import workers
+
+from .models import Follow, Post, TimelineEntry, UserStats
+from .paginator import CursorPaginator, seek
+from .stats import recount
+
+
+def reads_directly(author_id):
+    """Посты автора читаются напрямую, мимо лент подписчиков.
+
+    Отметка ставится, когда подписчиков становится больше
+    TIMELINE_FANOUT_LIMIT, и не снимается: посты, не попавшие в ленты,
+    иначе пропали бы из них, когда подписчиков снова станет меньше.
+    """
+    stats = UserStats.objects.filter(user_id=author_id).first()
+    if stats is None:
+        stats = recount(author_id)
+    popular = stats.followers_count > settings.TIMELINE_FANOUT_LIMIT
+    if popular and not stats.direct_reads:
+        stats.direct_reads = True
+        stats.save(update_fields=["direct_reads"])
+    return stats.direct_reads
+
+
+def direct_authors(user):
+    """Авторы из подписок пользователя, чьи посты читаются напрямую."""
+    return list(
+        UserStats.objects.filter(
+            user__in=Follow.objects.filter(user=user).values("author"),
+            direct_reads=True,
+        ).values_list("user_id", flat=True)
+    )
+
+
+def enqueue(post):
+    """Разложить пост по лентам в пуле после фиксации транзакции."""
+    transaction.on_commit(
+        lambda: workers.run("TIMELINE_WORKERS", fan_out, post)
+    )
+
+
+def fan_out(post):
+    """Кладёт новый пост в ленты подписчиков автора."""
+    if reads_directly(post.author_id):
+        return
+    followers = Follow.objects.filter(author_id=post.author_id).values_list(
+        "user_id", flat=True
+    )
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+            for user_id in followers.iterator()
+        ],
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+    for user_id in followers.iterator():
+        trim(user_id)
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту последние посты автора после подписки."""
+    if reads_directly(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).order_by("-pub_date")
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+            for pk, pub_date in posts.values_list("pk", "pub_date")[
+                :settings.TIMELINE_LENGTH
+            ]
+        ],
+        ignore_conflicts=True,
+    )
+    trim(user_id)
+
+
+def remove(user_id, author_id):
+    """Убирает из ленты посты автора после отписки."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def trim(user_id):
+    """Удаляет из ленты посты старше её TIMELINE_LENGTH-го поста.
+
+    Граница ищется по индексу ленты одним DELETE, без подсчёта записей.
+    Посты с той же датой, что у граничного, остаются.
+    """
+    entries = TimelineEntry.objects.filter(user_id=user_id)
+    length = settings.TIMELINE_LENGTH
+    boundary = entries.order_by("-pub_date", "-post_id").values("pub_date")
+    entries.filter(
+        pub_date__lt=Subquery(boundary[length - 1:length])
+    ).delete()
+
+
+def rebuild(user_id):
+    """Собирает ленту пользователя заново по его подпискам."""
+    TimelineEntry.objects.filter(user_id=user_id).delete()
+    for author_id in Follow.objects.filter(user_id=user_id).values_list(
+        "author_id", flat=True
+    ):
+        backfill(user_id, author_id)
+
+
+class TimelinePaginator(CursorPaginator):
+    """Лента подписок по курсору: материализованная и авторов напрямую.
+
+    Каждый источник читается по своему индексу не дальше одной страницы,
+    ключи (pub_date, id) сливаются, и посты страницы выбираются одним
+    запросом из object_list.
+    """
+
+    def __init__(self, object_list, per_page, user):
+        super().__init__(object_list, per_page)
+        self.user = user
+
+    def fetch(self, position, descending, limit):
+        entries = seek(
+            TimelineEntry.objects.filter(user=self.user),
+            "pub_date",
+            position,
+            descending,
+            pk="post_id",
+        )
+        keys = dict(entries.values_list("post_id", "pub_date")[:limit])
+        for author_id in direct_authors(self.user):
+            posts = seek(
+                Post.objects.filter(author_id=author_id),
+                "pub_date",
+                position,
+                descending,
+            )
+            keys.update(posts.values_list("pk", "pub_date")[:limit])
+        page = sorted(
+            keys, key=lambda pk: (keys[pk], pk), reverse=descending
+        )[:limit]
+        posts = self.object_list.in_bulk(page)
+        return [posts[pk] for pk in page if pk in posts]
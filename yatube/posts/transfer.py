@@ -0,0 +1,252 @@
+"""Выгрузка и загрузка групп, постов, комментариев и подписок.
+
+Записи ссылаются на пользователей по username и на группы по slug,
+поэтому данные переносятся между базами с разными id. Пост сохраняет
+свой id, если он в базе свободен, иначе получает новый; соответствие
+id постов пишется в отдельный файл SQLite (append_id_map), и по нему
+комментарии находят свои посты (lookup_id_map) пачка за пачкой, не
+загружая соответствие в память. Форматы — JSON Lines (одна запись на
+строку) и CSV с заголовком.
+"""
+import csv
+import json
+import sqlite3
+from contextlib import closing, contextmanager
+
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+FORMATS = ("jsonl", "csv")
+# Поле записи -> путь для values_list при выгрузке.
+SPECS = {
+    "group": (
+        Group,
+        {"title": "title", "slug": "slug", "description": "description"},
+    ),
+    "post": (
+        Post,
+        {
+            "id": "id",
+            "text": "text",
+            "pub_date": "pub_date",
+            "author": "author__username",
+            "group": "group__slug",
+            "image": "image",
+        },
+    ),
+    "comment": (
+        Comment,
+        {
+            "post": "post_id",
+            "author": "author__username",
+            "text": "text",
+            "created": "created",
+        },
+    ),
+    "follow": (
+        Follow,
+        {"user": "user__username", "author": "author__username"},
+    ),
+}
+USER_FIELDS = ("author", "user")
+DATE_FIELDS = ("pub_date", "created")
+# Поля, по которым узнаются уже загруженные посты и комментарии при
+# повторе пачки: уникального ключа у них нет.
+NATURAL_KEYS = {
+    "post": ("author_id", "pub_date", "text"),
+    "comment": ("post_id", "author_id", "created", "text"),
+}
+
+
+def guess_format(path):
+    return "csv" if path.endswith(".csv") else "jsonl"
+
+
+def export_rows(name):
+    """values_list записей модели по порядку pk и имена полей записи."""
+    model, spec = SPECS[name]
+    rows = model.objects.order_by("pk").values_list(*spec.values())
+    return rows, tuple(spec)
+
+
+def write_records(file, fmt, fields, rows):
+    """Пишет строки values_list и отдаёт число записанных после каждой."""
+    writer = None
+    if fmt == "csv":
+        writer = csv.writer(file, lineterminator="\n")
+        writer.writerow(fields)
+    for written, row in enumerate(rows, 1):
+        values = [
+            value.isoformat() if hasattr(value, "isoformat") else value
+            for value in row
+        ]
+        if writer is not None:
+            writer.writerow(["" if v is None else v for v in values])
+        else:
+            record = dict(zip(fields, values))
+            file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        yield written
+
+
+def read_records(file, fmt):
+    """Читает записи по одной, не загружая файл в память."""
+    if fmt == "csv":
+        yield from csv.DictReader(file)
+        return
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+@contextmanager
+def explicit_dates(model):
+    """Отключает auto_now_add, чтобы сохранить даты из выгрузки.
+
+    Меняет поле модели на время блока, поэтому предназначен для команд,
+    а не для кода, работающего параллельно с запросами.
+    """
+    fields = [
+        field
+        for field in model._meta.concrete_fields
+        if getattr(field, "auto_now_add", False)
+    ]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def resolve_users(usernames):
+    """{username: id}; недостающие пользователи создаются без пароля."""
+    users = dict(
+        User.objects.filter(username__in=usernames).values_list(
+            "username", "pk"
+        )
+    )
+    missing = set(usernames) - set(users)
+    if missing:
+        User.objects.bulk_create(
+            [User(username=username, password="!") for username in missing],
+            ignore_conflicts=True,
+        )
+        users.update(
+            User.objects.filter(username__in=missing).values_list(
+                "username", "pk"
+            )
+        )
+    return users
+
+
+def resolve_groups(slugs):
+    groups = dict(
+        Group.objects.filter(slug__in=slugs).values_list("slug", "pk")
+    )
+    unknown = set(slugs) - set(groups)
+    if unknown:
+        raise ValueError(f"Неизвестные группы: {', '.join(sorted(unknown))}")
+    return groups
+
+
+# Не больше стольких параметров в одном запросе к файлу соответствия.
+ID_MAP_CHUNK = 500
+
+
+def open_id_map(path):
+    database = sqlite3.connect(path)
+    database.execute(
+        "CREATE TABLE IF NOT EXISTS id_map "
+        "(source INTEGER PRIMARY KEY, target INTEGER NOT NULL)"
+    )
+    return closing(database)
+
+
+def lookup_id_map(path, sources):
+    """{id поста в выгрузке: id в базе} для id одной пачки."""
+    sources = sorted(sources)
+    ids = {}
+    with open_id_map(path) as database:
+        for start in range(0, len(sources), ID_MAP_CHUNK):
+            chunk = sources[start:start + ID_MAP_CHUNK]
+            placeholders = ", ".join("?" * len(chunk))
+            ids.update(
+                database.execute(
+                    "SELECT source, target FROM id_map "
+                    f"WHERE source IN ({placeholders})",
+                    chunk,
+                )
+            )
+    return ids
+
+
+def append_id_map(path, ids):
+    """Дописывает пары (id в выгрузке, id в базе) одной транзакцией."""
+    with open_id_map(path) as database, database:
+        database.executemany(
+            "INSERT OR REPLACE INTO id_map (source, target) VALUES (?, ?)",
+            ids,
+        )
+
+
+def natural_key(name, obj):
+    return tuple(getattr(obj, field) for field in NATURAL_KEYS[name])
+
+
+def find_loaded(name, objects):
+    """{естественный ключ: pk} записей пачки, которые уже есть в базе."""
+    fields = NATURAL_KEYS[name]
+    lookups = {
+        f"{field}__in": {getattr(obj, field) for obj in objects}
+        for field in fields
+        if field != "text"
+    }
+    rows = SPECS[name][0].objects.filter(**lookups)
+    return {row[:-1]: row[-1] for row in rows.values_list(*fields, "pk")}
+
+
+def build_objects(name, records, post_ids=None):
+    """Превращает пачку записей в несохранённые объекты модели.
+
+    id поста из выгрузки не переносится, его назначает загрузка;
+    post_ids переводит id постов в записях комментариев.
+    """
+    model = SPECS[name][0]
+    users = resolve_users(
+        {
+            record[field]
+            for record in records
+            for field in USER_FIELDS
+            if record.get(field)
+        }
+    )
+    groups = resolve_groups(
+        {record["group"] for record in records if record.get("group")}
+    )
+    now = timezone.now()
+    objects = []
+    for record in records:
+        values = {}
+        for field, value in record.items():
+            if field in USER_FIELDS:
+                values[f"{field}_id"] = users[value]
+            elif field == "group":
+                values["group_id"] = groups[value] if value else None
+            elif field == "id":
+                continue
+            elif field == "post":
+                if int(value) not in post_ids:
+                    raise ValueError(f"пост {value} не загружен")
+                values["post_id"] = post_ids[int(value)]
+            elif field in DATE_FIELDS:
+                values[field] = parse_datetime(value) if value else now
+            else:
+                values[field] = value or ""
+        objects.append(model(**values))
+    return objects
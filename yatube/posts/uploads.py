@@ -0,0 +1,223 @@
+"""Проверка и обработка загруженных картинок постов.
+
+Загрузка пишется во временный файл (FILE_UPLOAD_HANDLERS), а форма
+проверяет её по заголовку, не декодируя картинку: размер файла, число
+пикселей и размер анимации. Декодирование, уменьшение до
+POST_IMAGE_MAX_SIDE, удаление EXIF и перекодирование выполняет пул из
+IMAGE_UPLOAD_WORKERS потоков после фиксации транзакции, пост получает
+картинку, когда обработка закончена. Очередь ограничена
+IMAGE_UPLOAD_QUEUE, при переполнении форма просит повторить позже.
+Ход обработки хранится в кеше (status) для формы редактирования.
+"""
+import logging
+import os
+import tempfile
+import threading
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.move import file_move_safe
+from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, ImageOps
+
+from core import workers
+
+from . import thumbnails
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+STATUS_KEY = "upload:{}"
+STATUS_TIMEOUT = 60 * 60
+# Метаданные, которые нужны для правильного вывода картинки.
+KEPT_INFO = ("transparency", "icc_profile", "duration", "loop")
+# Служебные поля форматов без сведений об авторе и съёмке: из-за них
+# картинку перекодировать не нужно.
+FORMAT_INFO = (
+    "version",
+    "background",
+    "jfif",
+    "jfif_version",
+    "jfif_unit",
+    "jfif_density",
+    "dpi",
+    "gamma",
+    "progressive",
+    "progression",
+    "adobe",
+    "adobe_transform",
+    "interlace",
+)
+
+_pending = 0
+_lock = threading.Lock()
+
+
+def busy():
+    limit = settings.IMAGE_UPLOAD_WORKERS + settings.IMAGE_UPLOAD_QUEUE
+    return workers.use_workers("IMAGE_UPLOAD_WORKERS") and _pending >= limit
+
+
+def validate(upload):
+    """Проверяет загрузку по размеру файла и заголовку картинки."""
+    if upload.size > settings.POST_IMAGE_MAX_BYTES:
+        raise ValidationError(
+            "Файл больше "
+            f"{filesizeformat(settings.POST_IMAGE_MAX_BYTES)}."
+        )
+    upload.seek(0)
+    with Image.open(upload) as image:
+        width, height = image.size
+        animated = getattr(image, "is_animated", False)
+    if width * height > settings.POST_IMAGE_MAX_PIXELS:
+        megapixels = settings.POST_IMAGE_MAX_PIXELS / 1_000_000
+        raise ValidationError(f"Картинка больше {megapixels:g} Мп.")
+    if animated and max(width, height) > settings.POST_IMAGE_MAX_SIDE:
+        raise ValidationError(
+            "Анимация больше "
+            f"{settings.POST_IMAGE_MAX_SIDE} px по длинной стороне."
+        )
+    if busy():
+        raise ValidationError(
+            "Сейчас обрабатывается много картинок, попробуйте через минуту."
+        )
+
+
+def status(post_id):
+    return cache.get(STATUS_KEY.format(post_id))
+
+
+def set_status(post_id, state, progress, error=None):
+    cache.set(
+        STATUS_KEY.format(post_id),
+        {"state": state, "progress": progress, "error": error},
+        STATUS_TIMEOUT,
+    )
+
+
+def detach(form, post):
+    """Забирает новую загрузку из поста до обработки.
+
+    В посте остаётся прежняя картинка. Возвращает загрузку или None,
+    если новой картинки нет.
+    """
+    upload = form.cleaned_data.get("image")
+    if not isinstance(upload, UploadedFile):
+        return None
+    post.image = form.initial.get("image") or ""
+    return upload
+
+
+def stage(upload):
+    """Переносит загрузку в файл, который переживёт запрос.
+
+    TemporaryFileUploadHandler уже записал загрузку на диск, поэтому
+    файл переносится, а не копируется.
+    """
+    descriptor, path = tempfile.mkstemp(dir=settings.FILE_UPLOAD_TEMP_DIR)
+    if hasattr(upload, "temporary_file_path"):
+        os.close(descriptor)
+        file_move_safe(
+            upload.temporary_file_path(), path, allow_overwrite=True
+        )
+    else:
+        with os.fdopen(descriptor, "wb") as file:
+            for chunk in upload.chunks():
+                file.write(chunk)
+    return path
+
+
+def enqueue(post, upload):
+    """Обработать загрузку в пуле после фиксации транзакции.
+
+    Загрузка забирается из запроса только при фиксации: после отката
+    временный файл удалит сам Django. Без пула загрузка обрабатывается
+    сразу, в том же запросе.
+    """
+    if upload is None:
+        return
+    post_id, name = post.pk, upload.name
+    if not workers.use_workers("IMAGE_UPLOAD_WORKERS"):
+        process(post_id, stage(upload), name)
+        return
+    set_status(post_id, "queued", 0)
+    transaction.on_commit(lambda: submit(post_id, stage(upload), name))
+
+
+def submit(post_id, path, name):
+    global _pending
+    with _lock:
+        _pending += 1
+    workers.run("IMAGE_UPLOAD_WORKERS", process_queued, post_id, path, name)
+
+
+def process_queued(post_id, path, name):
+    global _pending
+    try:
+        process(post_id, path, name)
+    finally:
+        with _lock:
+            _pending -= 1
+
+
+def needs_reencoding(image):
+    if getattr(image, "is_animated", False):
+        return False
+    return max(image.size) > settings.POST_IMAGE_MAX_SIDE or any(
+        key not in KEPT_INFO + FORMAT_INFO for key in image.info
+    )
+
+
+def reencode(image):
+    """Уменьшенная копия без EXIF в исходном формате."""
+    image_format = image.format
+    side = settings.POST_IMAGE_MAX_SIDE
+    # JPEG сразу декодируется в уменьшенном масштабе.
+    image.draft(image.mode, (side, side))
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((side, side))
+    image.info = {
+        key: value for key, value in image.info.items() if key in KEPT_INFO
+    }
+    if image_format == "JPEG" and image.mode not in ("RGB", "L", "CMYK"):
+        image = image.convert("RGB")
+    output = BytesIO()
+    image.save(output, image_format, quality=85, optimize=True)
+    return output.getvalue()
+
+
+def process(post_id, path, name):
+    try:
+        set_status(post_id, "processing", 10)
+        with Image.open(path) as image:
+            if needs_reencoding(image):
+                content = ContentFile(reencode(image))
+            else:
+                content = None
+        set_status(post_id, "processing", 70)
+        post = Post.objects.filter(pk=post_id).first()
+        if post is None:
+            return
+        with open(path, "rb") as source, transaction.atomic():
+            if content is None:
+                content = File(source)
+            post.image.save(name, content, save=False)
+            # Ссылка на файл держит запись StoredImage до фиксации.
+            post.save(update_fields=["image"])
+            if not post.image.storage.exists(post.image.name):
+                # Такой же файл удалили (images.remove_files) между
+                # записью и ссылкой на него: кладём его заново.
+                post.image.save(name, content, save=False)
+        set_status(post_id, "done", 100)
+        thumbnails.enqueue(post.image)
+    except Exception:
+        logger.exception("Не удалось обработать картинку поста %s", post_id)
+        set_status(post_id, "failed", 100, "Не удалось обработать картинку.")
+    finally:
+        os.remove(path)
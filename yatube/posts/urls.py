@@ -1,11 +1,15 @@
 from django.urls import path
 
-from . import views
+from . import feeds, views
 
 app_name = "posts"
 urlpatterns = [
     path("", views.index, name="index"),
+    path("rss/", feeds.index_rss, name="index_rss"),
+    path("atom/", feeds.index_atom, name="index_atom"),
     path("group/<slug:slug>/", views.group_posts, name="group_posts"),
+    path("group/<slug:slug>/rss/", feeds.group_rss, name="group_rss"),
+    path("group/<slug:slug>/atom/", feeds.group_atom, name="group_atom"),
     path("follow/", views.follow_index, name="follow_index"),
     path(
         "profile/<str:username>/unfollow/",
@@ -18,11 +22,30 @@ urlpatterns = [
         name="profile_follow",
     ),
     path("profile/<str:username>/", views.profile, name="profile"),
+    path(
+        "profile/<str:username>/rss/", feeds.profile_rss, name="profile_rss"
+    ),
+    path(
+        "profile/<str:username>/atom/",
+        feeds.profile_atom,
+        name="profile_atom",
+    ),
     path("posts/<int:post_id>/", views.post_detail, name="post_detail"),
+    path(
+        "posts/<int:post_id>/comments/",
+        views.post_comments,
+        name="post_comments",
+    ),
     path("create/", views.post_create, name="post_create"),
     path("posts/<int:post_id>/edit/", views.post_edit, name="post_edit"),
+    path(
+        "posts/<int:post_id>/image/",
+        views.image_status,
+        name="image_status",
+    ),
     path(
         "posts/<int:post_id>/comment/", views.add_comment, name="add_comment"
     ),
     path("follow/", views.follow_index, name="follow_index"),
+    path("search/", views.post_search, name="search"),
 ]
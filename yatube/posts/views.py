@@ -1,81 +1,120 @@
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.db import transaction
+from django.http import JsonResponse, QueryDict
 from django.shortcuts import get_object_or_404, redirect, render
+from django.views.decorators.http import condition
 
+from core.cache import add_surrogate_keys
+from core.routers import replica_reads
+
+from . import conditional, search, uploads
+from .cache import (
+    ALL_FEEDS,
+    INDEX_FEED,
+    feed_cache_context,
+    group_feed,
+    post_page,
+    profile_feed,
+)
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post
+from .models import Comment, Follow, Group, Post
+from .paginator import CommentPaginator, get_page_obj
+from .stats import get_stats
+from .timeline import TimelinePaginator
 
 User = get_user_model()
 
 
+def get_comments_page(request, post_id):
+    comments = (
+        Comment.objects.filter(post_id=post_id)
+        .select_related("author")
+        .only("text", "created", "author__username")
+    )
+    paginator = CommentPaginator(comments, settings.COMMENTS_PAR_PAGE)
+    return paginator.get_page(request.GET.get("cursor"))
+
+
+@replica_reads
+@condition(conditional.index_etag, conditional.index_last_modified)
 def index(request):
+    add_surrogate_keys(request, ALL_FEEDS, INDEX_FEED)
     template = "posts/index.html"
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, settings.PAR_PAGE)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    post_list = Post.objects.for_feed()
+    page_obj = get_page_obj(request, post_list)
     title = "Последние обновления на сайте"
     context = {
         "page_obj": page_obj,
         "title": title,
+        **feed_cache_context(request, INDEX_FEED),
     }
     return render(request, template, context)
 
 
+@replica_reads
+@condition(conditional.group_etag, conditional.group_last_modified)
 def group_posts(request, slug):
     template = "posts/group_list.html"
     group = get_object_or_404(Group, slug=slug)
-    group_post_list = group.posts.all()
-    paginator = Paginator(group_post_list, settings.PAR_PAGE)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    add_surrogate_keys(request, ALL_FEEDS, group_feed(group.id))
+    group_post_list = group.posts.for_feed()
+    page_obj = get_page_obj(request, group_post_list)
     title = f"Записи сообщества {group}"
     context = {
         "group": group,
         "page_obj": page_obj,
         "title": title,
+        **feed_cache_context(request, group_feed(group.id)),
     }
     return render(request, template, context)
 
 
+@replica_reads
+@condition(conditional.profile_etag, conditional.profile_last_modified)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(
+        User.objects.select_related("stats"), username=username
+    )
+    add_surrogate_keys(request, ALL_FEEDS, profile_feed(author.id))
     title = f"Профайл пользователя {author}"
     template = "posts/profile.html"
-    profile_posts_list = author.posts.all()
-    counter_posts = profile_posts_list.count()
-    paginator = Paginator(profile_posts_list, settings.PAR_PAGE)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    profile_posts_list = author.posts.for_feed()
+    stats = get_stats(author)
+    page_obj = get_page_obj(request, profile_posts_list)
     following = (
         request.user.is_authenticated
         and Follow.objects.filter(
             user=request.user, author=author
         ).exists()
     )
-    followers_count = author.following.count()
-    following_count = author.follower.count()
     context = {
         "title": title,
         "page_obj": page_obj,
-        "counter_posts": counter_posts,
+        "counter_posts": stats.posts_count,
         "author": author,
         "following": following,
-        "followers_count": followers_count,
-        "following_count": following_count,
+        "followers_count": stats.followers_count,
+        "following_count": stats.following_count,
+        **feed_cache_context(request, profile_feed(author.id)),
     }
     return render(request, template, context)
 
 
+@replica_reads
+@condition(conditional.post_etag, conditional.post_last_modified)
 def post_detail(request, post_id):
+    add_surrogate_keys(request, ALL_FEEDS, post_page(post_id))
     template = "posts/post_detail.html"
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related("author__stats", "group"), id=post_id
+    )
+    add_surrogate_keys(request, profile_feed(post.author_id))
     title = post.text
-    counter_posts = post.author.posts.count()
+    counter_posts = get_stats(post.author).posts_count
     form = CommentForm()
-    comments = post.comments.all()
+    comments = get_comments_page(request, post.id)
     context = {
         "title": title,
         "post": post,
@@ -86,13 +125,30 @@ def post_detail(request, post_id):
     return render(request, template, context)
 
 
+@replica_reads
+@condition(conditional.post_etag, conditional.post_last_modified)
+def post_comments(request, post_id):
+    """Следующая порция комментариев для кнопки «Показать ещё»."""
+    add_surrogate_keys(request, ALL_FEEDS, post_page(post_id))
+    post = get_object_or_404(Post.objects.only("id"), id=post_id)
+    template = "includes/comment_list.html"
+    context = {
+        "post": post,
+        "comments": get_comments_page(request, post.id),
+    }
+    return render(request, template, context)
+
+
 @login_required
 def post_create(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
-        post.save()
+        upload = uploads.detach(form, post)
+        with transaction.atomic():
+            post.save()
+            uploads.enqueue(post, upload)
         return redirect("posts:profile", request.user)
     template = "posts/post_create.html"
     context = {"form": form}
@@ -108,7 +164,10 @@ def post_edit(request, post_id):
         request.POST or None, files=request.FILES or None, instance=post
     )
     if form.is_valid():
-        form.save()
+        upload = uploads.detach(form, post)
+        with transaction.atomic():
+            form.save()
+            uploads.enqueue(post, upload)
         return redirect("posts:post_detail", post_id)
     edit = True
     template = "posts/post_create.html"
@@ -116,10 +175,21 @@ def post_edit(request, post_id):
         "post": post,
         "form": form,
         "edit": edit,
+        "upload": uploads.status(post_id),
     }
     return render(request, template, context)
 
 
+@login_required
+def image_status(request, post_id):
+    """Ход обработки загруженной картинки для формы редактирования."""
+    post = get_object_or_404(Post.objects.only("author_id"), id=post_id)
+    if request.user.id != post.author_id:
+        return redirect("posts:post_detail", post_id)
+    upload = uploads.status(post_id)
+    return JsonResponse(upload or {"state": "none", "progress": 0})
+
+
 @login_required
 def add_comment(request, post_id):
     post = get_object_or_404(Post, id=post_id)
@@ -132,17 +202,43 @@ def add_comment(request, post_id):
     return redirect("posts:post_detail", post_id=post_id)
 
 
+@replica_reads
 @login_required
+@condition(conditional.follow_etag, conditional.follow_last_modified)
 def follow_index(request):
-    posts_list = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(posts_list, settings.PAR_PAGE)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    if settings.FOLLOW_TIMELINE:
+        paginator = TimelinePaginator(
+            Post.objects.for_feed(), settings.PAR_PAGE, request.user
+        )
+        page_obj = paginator.get_page(request.GET.get("cursor"))
+    else:
+        posts_list = Post.objects.for_feed().filter(
+            author__following__user=request.user
+        )
+        page_obj = get_page_obj(request, posts_list)
     template = "posts/follow.html"
     title = "Подписки"
     context = {
         "page_obj": page_obj,
-        "paginator": paginator,
+        "paginator": page_obj.paginator,
+        "title": title,
+    }
+    return render(request, template, context)
+
+
+def post_search(request):
+    query = request.GET.get("q", "").strip()
+    post_list = search.search_posts(Post.objects.for_feed(), query)
+    paginator = search.RankPaginator(post_list, settings.PAR_PAGE)
+    page_obj = paginator.get_page(request.GET.get("cursor"))
+    page_query = QueryDict(mutable=True)
+    page_query["q"] = query
+    template = "posts/search.html"
+    title = f"Поиск: {query}" if query else "Поиск"
+    context = {
+        "page_obj": page_obj,
+        "query": query,
+        "page_query": f"{page_query.urlencode()}&",
         "title": title,
     }
     return render(request, template, context)
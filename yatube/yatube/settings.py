@@ -50,6 +50,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.middleware.ServerTimingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -57,6 +58,8 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "core.middleware.ReplicaPinMiddleware",
+    "core.middleware.AnonymousPageCacheMiddleware",
 ]
 
 LOGIN_URL = "users:login"
@@ -98,6 +101,23 @@ DATABASES = {
     }
 }
 
+# Реплика для чтения лент (см. core.routers): путь к файлу копии базы
+# задаёт переменная окружения DATABASE_REPLICA.
+REPLICA_DATABASE = None
+if os.environ.get("DATABASE_REPLICA"):
+    DATABASES["replica"] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": os.environ["DATABASE_REPLICA"],
+        "TEST": {"MIRROR": "default"},
+    }
+    REPLICA_DATABASE = "replica"
+DATABASE_ROUTERS = ["core.routers.ReplicaRouter"]
+# Сколько секунд после записи пользователь читает из основной базы.
+REPLICA_STICKY_SECONDS = 5
+
+# PRAGMA для каждого нового соединения SQLite (см. core.db).
+SQLITE_PRAGMAS = {}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -143,14 +163,93 @@ EMAIL_BACKEND = "django.core.mail.backends.filebased.EmailBackend"
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
 
 PAR_PAGE = 10
+# Карты сайта пишет команда generate_sitemaps, в продакшене их отдаёт
+# веб-сервер из SITEMAP_ROOT. SITE_URL — адрес сайта для ссылок в картах.
+SITE_URL = "http://localhost:8000"
+SITEMAP_ROOT = os.path.join(BASE_DIR, "sitemaps")
+SITEMAP_URL = "/sitemaps/"
+SITEMAP_CHUNK_SIZE = 10000
+
+# Записей в RSS и Atom.
+SYNDICATION_ITEMS = 20
+# Комментарии на странице поста; следующие подгружаются кнопкой.
+COMMENTS_PAR_PAGE = 20
+# Курсорная пагинация лент вместо ?page=N (без COUNT и OFFSET).
+CURSOR_PAGINATION = False
 
 CSRF_FAILURE_VIEW = "core.views.csrf_failure"
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+# Материализованная лента подписок: посты раскладываются по лентам
+# подписчиков после публикации в пуле из TIMELINE_WORKERS потоков
+# (0 — сразу после фиксации транзакции). Посты авторов с числом
+# подписчиков больше TIMELINE_FANOUT_LIMIT читаются напрямую. После
+# включения ленты нужно собрать командой rebuild_timelines.
+FOLLOW_TIMELINE = False
+TIMELINE_FANOUT_LIMIT = 5000
+TIMELINE_LENGTH = 1000
+TIMELINE_WORKERS = 1
+
+# Фрагменты лент сбрасываются сигналами при записи, TTL только страховка.
+FEED_CACHE_TIMEOUT = 60 * 60 * 6
+
+# Заголовок Server-Timing и гистограммы по URL (команда timing_report).
+# Гистограммы пишутся в таблицу не чаще раза в TIMING_FLUSH_SECONDS
+# на процесс.
+SERVER_TIMING = DEBUG
+TIMING_HISTOGRAMS = DEBUG
+TIMING_FLUSH_SECONDS = 60
+
+# Страницы для анонимных пользователей сбрасываются по ключам при записи.
+PAGE_CACHE_TIMEOUT = 60 * 60
+
+# Миниатюры картинок постов создаются в фоне после сохранения поста.
+# THUMBNAIL_WORKERS = 0 создаёт их сразу после фиксации транзакции.
+# Каждая ширина сохраняется во всех форматах, которые умеет Pillow;
+# последний формат — запасной для браузеров без WebP.
+POST_THUMBNAIL_GEOMETRY = "960x339"
+POST_THUMBNAIL = {"crop": "center", "upscale": True}
+POST_IMAGE_WIDTHS = (320, 640, 960)
+POST_IMAGE_FORMATS = ("WEBP", "JPEG")
+POST_IMAGE_SIZES = "(max-width: 992px) 100vw, 960px"
+THUMBNAIL_WORKERS = 2
+# Метаданные миниатюр sorl-thumbnail хранятся в базе с кешем поверх
+# (это значение по умолчанию, закреплено явно): после перезапуска
+# генерация вариантов не проверяет хранилище заново.
+THUMBNAIL_KVSTORE = "sorl.thumbnail.kvstores.cached_db_kvstore.KVStore"
+
+# Загрузки всегда пишутся во временный файл и проверяются по заголовку
+# картинки (см. posts.uploads). Картинки больше POST_IMAGE_MAX_SIDE по
+# длинной стороне уменьшаются, EXIF удаляется в пуле из
+# IMAGE_UPLOAD_WORKERS потоков; в очереди ждут не больше
+# IMAGE_UPLOAD_QUEUE загрузок. IMAGE_UPLOAD_WORKERS = 0 обрабатывает
+# картинку прямо в запросе.
+FILE_UPLOAD_HANDLERS = [
+    "django.core.files.uploadhandler.TemporaryFileUploadHandler"
+]
+POST_IMAGE_MAX_BYTES = 20 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 40_000_000
+POST_IMAGE_MAX_SIDE = 2560
+IMAGE_UPLOAD_WORKERS = 2
+IMAGE_UPLOAD_QUEUE = 8
+
+# Кеш двухуровневый (core.cache_backends): небольшой LRU процесса перед
+# общим кешем "shared". Локально хранятся только записи, сверяемые со
+# счётчиками версий. Здесь общий кеш — LocMemCache одного процесса, в
+# yatube.settings_production — memcached или таблица в базе.
 CACHES = {
     "default": {
+        "BACKEND": "core.cache_backends.TwoTierCache",
+        "OPTIONS": {
+            "SHARED": "shared",
+            "LOCAL_MAX_ENTRIES": 500,
+            "LOCAL_TIMEOUT": 30,
+            "LOCAL_PREFIXES": ("template.cache.", "page:", "api:"),
+        },
+    },
+    "shared": {
         "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
-    }
+    },
 }
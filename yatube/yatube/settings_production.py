@@ -0,0 +1,44 @@
+"""Профиль для продакшена: DJANGO_SETTINGS_MODULE=yatube.settings_production.
+
+Соединения с базой живут между запросами, SQLite работает в режиме WAL:
+запись поста или комментария не блокирует чтение лент. Режим WAL
+сохраняется в файле базы и остаётся после возврата к yatube.settings.
+Кеш общий для всех процессов: memcached по адресу MEMCACHED_LOCATION
+(клиент python-memcached из requirements.txt)
+или таблица в базе (python manage.py createcachetable).
+"""
+import os
+
+from .settings import *  # noqa: F401,F403
+from .settings import CACHES, DATABASES
+
+DEBUG = False
+SERVER_TIMING = False
+TIMING_HISTOGRAMS = True
+
+DATABASES["default"]["CONN_MAX_AGE"] = 600
+# Писатель ждёт блокировку вместо немедленной ошибки database is locked.
+DATABASES["default"]["OPTIONS"] = {"timeout": 20}
+
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    # В режиме WAL NORMAL не теряет целостность, только последние
+    # транзакции при отключении питания.
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024 * 1024,
+    # Отрицательное значение — размер в КиБ: 64 МиБ на соединение.
+    "cache_size": -64 * 1024,
+    "temp_store": "MEMORY",
+}
+
+if os.environ.get("MEMCACHED_LOCATION"):
+    CACHES["shared"] = {
+        "BACKEND": "django.core.cache.backends.memcached.MemcachedCache",
+        "LOCATION": os.environ["MEMCACHED_LOCATION"],
+    }
+else:
+    CACHES["shared"] = {
+        "BACKEND": "core.cache_backends.DatabaseCache",
+        "LOCATION": "cache_entries",
+        "OPTIONS": {"MAX_ENTRIES": 100_000},
+    }